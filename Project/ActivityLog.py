@@ -0,0 +1,109 @@
+import numpy as np
+
+
+# Activity kinds (stored in the `kind` field)
+MOVE = 0
+TRADE = 1
+
+ACTIVITY_DTYPE = np.dtype([
+    ("step", "<u4"),
+    ("agent", "<i4"),
+    ("kind", "u1"),
+    ("other", "<i4"),
+    ("old_x", "<i4"),
+    ("old_y", "<i4"),
+    ("new_x", "<i4"),
+    ("new_y", "<i4"),
+    ("wealth", "<f8"),
+    ("other_wealth", "<f8"),
+])
+
+HISTORY_MODES = ["off", "ring", "sampled"]
+
+
+class ActivityLog:
+    """Opt-in log of agent moves and trades for the whole model.
+
+    Records are fixed-width rows of one structured NumPy array shared by
+    all agents, holding at most the most recent `size` kept records.
+    Which records are kept is set by mode:
+      "off"     - nothing is stored
+      "ring"    - every record
+      "sampled" - only records from every `sample_every`-th step, so the
+                  same capacity spans a longer stretch of the run
+    """
+
+    def __init__(self, mode="off", size=100_000, sample_every=10):
+        if mode not in HISTORY_MODES:
+            raise ValueError(f"Unknown history mode {mode!r} (expected one of {HISTORY_MODES})")
+        if size < 1 or sample_every < 1:
+            raise ValueError("size and sample_every must be at least 1")
+        self.mode = mode
+        self.size = size
+        self.sample_every = sample_every
+        self.enabled = mode != "off"
+        self._count = 0
+        self._buf = np.zeros(size if self.enabled else 0, dtype=ACTIVITY_DTYPE)
+
+    def _keep(self, step):
+        return self.mode == "ring" or step % self.sample_every == 0
+
+    def _write(self, row):
+        self._buf[self._count % self.size] = row
+        self._count += 1
+
+    def _write_many(self, rows):
+        # Only the newest `size` rows can survive
+        skipped = max(len(rows) - self.size, 0)
+        self._count += skipped
+        rows = rows[skipped:]
+        self._buf[(self._count + np.arange(len(rows))) % self.size] = rows
+        self._count += len(rows)
+
+    def log_moves(self, step, agents, old_x, old_y, new_x, new_y):
+        """Log one move per agent (arrays of equal length)."""
+        if not (self.enabled and self._keep(step)):
+            return
+        rows = np.zeros(len(agents), dtype=ACTIVITY_DTYPE)
+        rows["step"] = step
+        rows["agent"] = agents
+        rows["kind"] = MOVE
+        rows["other"] = -1
+        rows["old_x"], rows["old_y"] = old_x, old_y
+        rows["new_x"], rows["new_y"] = new_x, new_y
+        rows["wealth"] = rows["other_wealth"] = np.nan
+        self._write_many(rows)
+
+    def log_move(self, step, agent, old_pos, new_pos):
+        if self.enabled and self._keep(step):
+            self._write((step, agent, MOVE, -1, old_pos[0], old_pos[1],
+                         new_pos[0], new_pos[1], np.nan, np.nan))
+
+    def log_trade(self, step, agent, other, pos, wealth, other_wealth):
+        if self.enabled and self._keep(step):
+            self._write((step, agent, TRADE, other, pos[0], pos[1],
+                         pos[0], pos[1], wealth, other_wealth))
+
+    @property
+    def total_count(self):
+        """Number of records ever written (including evicted ones)."""
+        return self._count
+
+    def _segments(self):
+        """Views of the retained records, oldest first."""
+        if self._count > self.size:
+            start = self._count % self.size
+            return [self._buf[start:], self._buf[:start]]
+        return [self._buf[:self._count]]
+
+    def records(self):
+        """Retained records, oldest first."""
+        return np.concatenate(self._segments())
+
+    def for_agent(self, agent_id):
+        """Retained records of one agent, oldest first."""
+        return np.concatenate([seg[seg["agent"] == agent_id]
+                               for seg in self._segments()])
+
+    def __len__(self):
+        return min(self._count, self.size)
@@ -0,0 +1,236 @@
+import numpy as np
+
+
+def neighbourhood_offsets(width, height, radius=1, moore=True, include_center=False):
+    """(dx, dy) offsets of a torus neighbourhood, in MultiGrid's order.
+
+    The radius is capped at half the grid, dropping the duplicate edge on
+    even dimensions, exactly as MultiGrid does on a torus.
+    """
+    x_max, y_max = width // 2, height // 2
+    x_radius, y_radius = min(radius, x_max), min(radius, y_max)
+    kx = int(x_radius == x_max and width % 2 == 0)
+    ky = int(y_radius == y_max and height % 2 == 0)
+    return [(dx, dy)
+            for dx in range(-x_radius, x_radius + 1 - kx)
+            for dy in range(-y_radius, y_radius + 1 - ky)
+            if (moore or abs(dx) + abs(dy) <= radius)
+            and (include_center or (dx, dy) != (0, 0))]
+
+
+class ArrayGrid:
+    """Torus grid that keeps agent positions in NumPy arrays.
+
+    Implements the parts of Mesa's MultiGrid the models use (placing,
+    moving and querying agents, neighbourhoods) plus batch kernels that
+    move every agent at once and pair cellmates in one vectorised pass.
+
+    Agents are addressed by slot, their order of placement. The
+    cell -> agents index is CSR-style: agent slots sorted by cell id next
+    to the sorted cell ids, rebuilt lazily after agents move. Neighbourhood
+    offsets are precomputed per (radius, moore, include_center) in the
+    same order Mesa returns them. Memory scales with the number of
+    agents, not the area of the grid.
+    """
+
+    def __init__(self, width, height, torus=True, capacity=64):
+        if not torus:
+            raise ValueError("ArrayGrid only supports torus grids")
+        self.width = width
+        self.height = height
+        self.torus = True
+        self._n = 0
+        self._x = np.empty(max(capacity, 1), dtype=np.int64)
+        self._y = np.empty(max(capacity, 1), dtype=np.int64)
+        self._agents = []
+        self._slots = {}
+        self._index = None
+        self._offsets = {}
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def x(self):
+        return self._x[:self._n]
+
+    @property
+    def y(self):
+        return self._y[:self._n]
+
+    @property
+    def agents(self):
+        """Agents by slot (None for slots placed with place_many)."""
+        return self._agents
+
+    def slot(self, agent):
+        return self._slots[agent.unique_id]
+
+    def cells(self):
+        """Cell id (y * width + x) of every slot."""
+        return self.y * self.width + self.x
+
+    # ---- Neighbourhoods ----
+
+    def offsets(self, radius=1, moore=True, include_center=False):
+        """(dx, dy) offsets of a neighbourhood, in Mesa's order."""
+        key = (radius, moore, include_center)
+        if key not in self._offsets:
+            offsets = neighbourhood_offsets(self.width, self.height, *key)
+            self._offsets[key] = np.array(offsets, dtype=np.int64).reshape(-1, 2)
+        return self._offsets[key]
+
+    def get_neighborhood(self, pos, moore=True, include_center=False, radius=1):
+        off = self.offsets(radius, moore, include_center)
+        xs = (pos[0] + off[:, 0]) % self.width
+        ys = (pos[1] + off[:, 1]) % self.height
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def neighbour_cells(self, slots, radius=1, moore=True, include_center=False):
+        """Cell ids around each slot's position, one row per slot."""
+        off = self.offsets(radius, moore, include_center)
+        xs = (self._x[slots, None] + off[:, 0]) % self.width
+        ys = (self._y[slots, None] + off[:, 1]) % self.height
+        return ys * self.width + xs
+
+    # ---- Placement and queries (MultiGrid API) ----
+
+    def _reserve(self, extra):
+        capacity = len(self._x)
+        if self._n + extra <= capacity:
+            return
+        while capacity < self._n + extra:
+            capacity *= 2
+        for name in ("_x", "_y"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    def place_agent(self, agent, pos):
+        self._reserve(1)
+        slot = self._n
+        self._x[slot], self._y[slot] = pos
+        self._n += 1
+        self._agents.append(agent)
+        self._slots[agent.unique_id] = slot
+        self._index = None
+        agent.pos = pos
+
+    def place_many(self, xs, ys):
+        """Place anonymous agents at the given coordinates. Returns their slots."""
+        k = len(xs)
+        self._reserve(k)
+        start = self._n
+        self._x[start:start + k] = xs
+        self._y[start:start + k] = ys
+        self._n += k
+        self._agents.extend([None] * k)
+        self._index = None
+        return np.arange(start, start + k)
+
+    def move_agent(self, agent, pos):
+        slot = self._slots[agent.unique_id]
+        self._x[slot], self._y[slot] = pos
+        self._index = None
+        agent.pos = pos
+
+    def is_cell_empty(self, pos):
+        sorted_cells, _ = self._cell_index()
+        cell = pos[1] * self.width + pos[0]
+        i = np.searchsorted(sorted_cells, cell)
+        return i == len(sorted_cells) or sorted_cells[i] != cell
+
+    def _cell_index(self):
+        if self._index is None:
+            cells = self.cells()
+            order = np.argsort(cells, kind="stable")
+            self._index = (cells[order], order)
+        return self._index
+
+    def cell_slots(self, cell_ids):
+        """Slots of the agents in the given cells, cell by cell."""
+        sorted_cells, order = self._cell_index()
+        cell_ids = np.asarray(cell_ids, dtype=np.int64).ravel()
+        lo = np.searchsorted(sorted_cells, cell_ids)
+        hi = np.searchsorted(sorted_cells, cell_ids, side="right")
+        if len(cell_ids) == 1:
+            return order[lo[0]:hi[0]]
+        lengths = hi - lo
+        ends = np.cumsum(lengths)
+        return order[np.repeat(lo - ends + lengths, lengths) + np.arange(ends[-1])]
+
+    def get_cell_list_contents(self, cell_list):
+        if isinstance(cell_list, tuple) and len(cell_list) == 2 \
+                and not isinstance(cell_list[0], tuple):
+            cell_list = [cell_list]
+        cells = [y * self.width + x for x, y in cell_list]
+        agents = self._agents
+        return [agents[s] for s in self.cell_slots(cells).tolist()]
+
+    def iter_cell_list_contents(self, cell_list):
+        return iter(self.get_cell_list_contents(cell_list))
+
+    def get_neighbors(self, pos, moore=True, include_center=False, radius=1):
+        off = self.offsets(radius, moore, include_center)
+        cells = ((pos[1] + off[:, 1]) % self.height) * self.width \
+            + (pos[0] + off[:, 0]) % self.width
+        agents = self._agents
+        return [agents[s] for s in self.cell_slots(cells).tolist()]
+
+    # ---- Batch kernels ----
+
+    def move_random(self, rng):
+        """Move every agent to a random Moore neighbour cell at once.
+
+        Returns the cell ids the agents moved from.
+        """
+        old_cell = self.cells()
+        off = self.offsets(1)
+        step = off[rng.integers(0, len(off), self._n)]
+        self.x[:] = (self.x + step[:, 0]) % self.width
+        self.y[:] = (self.y + step[:, 1]) % self.height
+        self._index = None
+
+        if self._slots:
+            for agent, x, y in zip(self._agents, self.x.tolist(), self.y.tolist()):
+                agent.pos = (x, y)
+        return old_cell
+
+    def cellmate_pairs(self, old_cell, priority, rng):
+        """Random distinct cellmate for every agent, as sequential activation sees it.
+
+        Agents act in `priority` order (a permutation of the slots) and
+        each moves just before it trades, so an agent meets those that
+        already acted in their current cells and those still waiting in
+        their `old_cell`. Each agent with company draws one of them
+        uniformly. Returns (initiators, partners) in activation order.
+        """
+        n = self._n
+        new_key = self.cells() * n + priority
+        old_key = old_cell * n + priority
+        new_order = np.argsort(new_key)
+        old_order = np.argsort(old_key)
+        new_sorted = new_key[new_order]
+        old_sorted = old_key[old_order]
+
+        # Work in new-cell order so every search below has sorted queries.
+        # Cellmates that acted earlier are in their new cell, those that
+        # act later are still in their old cell
+        base = new_sorted - new_sorted % n
+        first_new = np.searchsorted(new_sorted, base)
+        n_before = np.arange(n) - first_new
+        first_old = np.searchsorted(old_sorted, new_sorted, side="right")
+        n_after = np.searchsorted(old_sorted, base + n) - first_old
+        total = n_before + n_after
+
+        k = np.flatnonzero(total > 0)
+        a = new_order[k]
+        r = (rng.random(len(k)) * total[k]).astype(np.int64)
+        before = r < n_before[k]
+        o = np.where(before,
+                     new_order[np.minimum(first_new[k] + r, n - 1)],
+                     old_order[np.minimum(first_old[k] + r - n_before[k], n - 1)])
+
+        activation = np.argsort(priority[a])
+        return a[activation], o[activation]
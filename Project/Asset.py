@@ -1,5 +1,5 @@
 class Asset:
-    """Lightweight holding record. Price is managed by the Market."""
+    """Aggregated holding record (name, quantity). Price is managed by the Market."""
 
     def __init__(self, name: str, quantity: int):
         self.name = name
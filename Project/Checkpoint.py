@@ -0,0 +1,52 @@
+import pickle
+import struct
+import zlib
+
+
+MAGIC = b"FMCKPT"
+VERSION = 6
+_HEADER = struct.Struct("<6sH")
+
+
+def save_checkpoint(model, path, compress_level=6):
+    """Write the complete model state to a compact binary file.
+
+    The file is a small header followed by a zlib-compressed pickle of the
+    model (grid, scheduler, agents and their strategy state, market books
+    and history, random streams, active events, collected data).
+    """
+    payload = pickle.dumps({"model": model}, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION))
+        f.write(zlib.compress(payload, compress_level))
+
+
+def load_checkpoint(path, resume_journal=False, resume_recorder=False):
+    """Read a model written by save_checkpoint.
+
+    The model's random streams are part of its state, so the resumed run
+    is identical to one that never stopped. Its trade journal and
+    metrics recorder, if any, stay read-only unless `resume_journal` /
+    `resume_recorder` is set (see TradeJournal.resume and
+    Recorder.resume), so just loading a checkpoint never touches their
+    files.
+    """
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+        if len(header) != _HEADER.size:
+            raise ValueError(f"{path} is not a model checkpoint")
+        magic, version = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a model checkpoint")
+        if version != VERSION:
+            raise ValueError(
+                f"Unsupported checkpoint version {version} (expected {VERSION})")
+        state = pickle.loads(zlib.decompress(f.read()))
+    model = state["model"]
+    journal = getattr(model, "journal", None)
+    if resume_journal and journal is not None:
+        journal.resume()
+    recorder = getattr(model, "recorder", None)
+    if resume_recorder and recorder is not None:
+        recorder.resume()
+    return model
@@ -2,11 +2,15 @@
 Streamlit dashboard for the Financial Market Simulation.
 Run with: streamlit run Dashboard.py
 """
+import os
+
 import streamlit as st
 import plotly.graph_objects as go
 import plotly.express as px
 import pandas as pd
-from FinancialModel import FinancialModel, STRATEGIES
+from FinancialModel import FinancialModel, STRATEGIES, STEP_MODES
+from MetricsCollector import COLLECTION_PRESETS
+from RunCache import RunCache
 
 st.set_page_config(page_title="Financial Market Simulation", layout="wide")
 
@@ -28,76 +32,103 @@ event_mode = st.sidebar.selectbox("Market Event",
 grid_size = st.sidebar.slider("Grid Size", 5, 30, 10)
 n_steps = st.sidebar.slider("Steps to Run", 50, 1000, 300, step=50)
 candle_period = st.sidebar.slider("Candlestick Period (steps)", 3, 20, 5)
+collection = st.sidebar.selectbox("Data Collection", list(COLLECTION_PRESETS))
+step_mode = st.sidebar.selectbox("Step Mode", STEP_MODES)
+price_history_maxlen = st.sidebar.selectbox(
+    "Price History", [None, 100, 250, 500],
+    format_func=lambda n: "All" if n is None else f"Last {n} steps")
+price_history_dtype = st.sidebar.selectbox("Price Precision", ["float64", "float32"])
+seed = st.sidebar.number_input("Seed", min_value=0, value=0, step=1)
 
 run = st.sidebar.button("Run Simulation", type="primary")
 
 st.title("Financial Market Simulation")
 
-if not run:
-    st.info("Configure parameters in the sidebar and click **Run Simulation**.")
-    st.stop()
-
-# ── Run Simulation ──
-progress = st.progress(0, text="Running simulation...")
-
-model = FinancialModel(
-    number_of_agents=n_agents, width=grid_size, height=grid_size,
-    strategy_mode=strategy_mode, initial_wealth=initial_wealth,
-    asset_config=asset_config, event_mode=event_mode
-)
+# Finished runs, so repeating a configuration does not re-simulate it
+RUN_CACHE = RunCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".run_cache"))
 
-# Collect step-by-step data
-step_data = []
-agent_snapshots = []
 
-for i in range(n_steps):
-    model.step()
-
-    # Close candles at custom period
-    if i > 0 and i % candle_period == 0:
-        for name in model.market.get_asset_names():
-            model.market.close_candle(name)
-
-    # Collect per-step metrics
-    row = {"step": i + 1}
+# ── Run Simulation ──
+def run_simulation():
+    """Results for the sidebar parameters, from the run cache if possible."""
+    params = dict(
+        number_of_agents=n_agents, width=grid_size, height=grid_size,
+        strategy_mode=strategy_mode, initial_wealth=initial_wealth,
+        asset_config=asset_config, event_mode=event_mode,
+        collection=collection, step_mode=step_mode,
+        price_history_maxlen=price_history_maxlen,
+        price_history_dtype=price_history_dtype
+    )
+    return RUN_CACHE.get_or_run({"dashboard": params, "n_steps": n_steps}, int(seed),
+                                lambda: simulate(params, int(seed)))
+
+
+def simulate(params, seed):
+    """Run the model and collect its series and final agent table."""
+    progress = st.progress(0, text="Running simulation...")
+
+    model = FinancialModel(**params, seed=seed)
+
+    agent_snapshots = []
+
+    for i in range(n_steps):
+        model.step()
+        if (i + 1) % max(1, n_steps // 20) == 0:
+            progress.progress((i + 1) / n_steps, text=f"Step {i+1}/{n_steps}")
+
+    progress.empty()
+
+    # Per-step metrics, as kept by the model's collector
+    metrics = model.metrics.get_model_vars_dataframe()
+    columns = {
+        "Gini": "gini", "Total Wealth": "total_wealth",
+        "Wealthiest Agent": "wealthiest", "Total Trades": "total_trades",
+        "Total Interactions": "total_interactions",
+        "Wealthy Agents": "wealthy_count", "Non Wealthy Agents": "broke_count",
+    }
     for name in model.market.get_asset_names():
-        row[f"{name}_price"] = model.market.get_price(name)
-        row[f"{name}_vol"] = model.market.get_volatility(name)
-    row["gini"] = model.compute_gini()
-    row["total_wealth"] = model.compute_total_wealth()
-    row["wealthiest"] = model.get_wealthiest_agent()
-    row["total_trades"] = model.compute_total_trades()
-    row["total_interactions"] = model.compute_total_interactions()
-    row["wealthy_count"] = model.current_wealthy_agents()
-    row["broke_count"] = model.current_non_wealthy_agents()
-    for s in STRATEGIES:
-        row[s] = sum(1 for a in model.schedule.agents if a.strategy_name == s)
-    step_data.append(row)
-
-    if (i + 1) % max(1, n_steps // 20) == 0:
-        progress.progress((i + 1) / n_steps, text=f"Step {i+1}/{n_steps}")
-
-progress.empty()
-
-df = pd.DataFrame(step_data)
-
-# Final agent data
-for a in model.schedule.agents:
-    agent_snapshots.append({
-        "ID": a.unique_id,
-        "Strategy": a.strategy_name,
-        "Wealth": round(a.wealth, 2),
-        "Net Worth": round(a.net_worth, 2),
-        "Assets": len(a.assets),
-        "Trades": a.trades_completed,
-        "Fees Paid": round(a.fees_paid, 2),
-        "P&L": round(a.wealth - a.initial_wealth, 2),
-        "Mood": getattr(a, 'mood', 'N/A'),
-    })
-agent_df = pd.DataFrame(agent_snapshots).sort_values("Net Worth", ascending=False)
+        columns[f"{name} Price"] = f"{name}_price"
+        columns[f"{name} Volatility"] = f"{name}_vol"
+    columns.update((s, s) for s in STRATEGIES)
+    df = metrics[list(columns)].rename(columns=columns)
+    df = df.rename_axis("step").reset_index()
+
+    # Final agent data
+    for a in model.schedule.agents:
+        agent_snapshots.append({
+            "ID": a.unique_id,
+            "Strategy": a.strategy_name,
+            "Wealth": round(a.wealth, 2),
+            "Net Worth": round(a.net_worth, 2),
+            "Assets": a.total_units,
+            "Trades": a.trades_completed,
+            "Fees Paid": round(a.fees_paid, 2),
+            "P&L": round(a.wealth - a.initial_wealth, 2),
+            "Mood": getattr(a, 'mood', 'N/A'),
+        })
+    agent_df = pd.DataFrame(agent_snapshots).sort_values("Net Worth", ascending=False)
+
+    return {"market": model.market, "df": df, "agent_df": agent_df,
+            "n_steps": n_steps, "n_agents": n_agents}
+
+
+# Keep the last run across Streamlit reruns, so display-only controls such
+# as the candlestick period re-aggregate candles instead of re-simulating
+if run:
+    st.session_state["results"] = run_simulation()
+
+if "results" not in st.session_state:
+    st.info("Configure parameters in the sidebar and click **Run Simulation**.")
+    st.stop()
+
+results = st.session_state["results"]
+market = results["market"]
+df = results["df"]
+agent_df = results["agent_df"]
 
 # ── Layout ──
-st.success(f"Simulation complete: {n_steps} steps, {n_agents} agents")
+st.success(f"Simulation complete: {results['n_steps']} steps, "
+           f"{results['n_agents']} agents")
 
 # Top row: key metrics
 col1, col2, col3, col4, col5 = st.columns(5)
@@ -108,32 +139,31 @@ col2.metric("Gini Coefficient", f"{df['gini'].iloc[-1]:.3f}",
 col3.metric("Total Trades", f"{int(df['total_trades'].iloc[-1])}")
 col4.metric("Wealthy / Broke",
             f"{int(df['wealthy_count'].iloc[-1])} / {int(df['broke_count'].iloc[-1])}")
-col5.metric("Fees Collected", f"{model.market.total_fees_collected:.1f}")
+col5.metric("Fees Collected", f"{market.total_fees_collected:.1f}")
 
 st.divider()
 
 # ── Candlestick Charts ──
 st.subheader("Market Prices")
 
-asset_names = model.market.get_asset_names()
+asset_names = market.get_asset_names()
 tabs = st.tabs(asset_names + ["Overlay"])
 
 for idx, name in enumerate(asset_names):
     with tabs[idx]:
-        ohlc = model.market.get_ohlc(name)
-        if len(ohlc) > 1:
+        ohlc = market.get_ohlc(name, candle_period)
+        if len(ohlc["close"]) > 1:
             ohlc_df = pd.DataFrame(ohlc)
-            ohlc_df["step"] = range(len(ohlc_df))
 
             fig = go.Figure(data=[go.Candlestick(
-                x=ohlc_df["step"],
+                x=ohlc_df["tick"],
                 open=ohlc_df["open"], high=ohlc_df["high"],
                 low=ohlc_df["low"], close=ohlc_df["close"],
                 increasing_line_color="#2ecc71", decreasing_line_color="#e74c3c",
             )])
             fig.update_layout(
                 title=f"{name} — Candlestick Chart",
-                xaxis_title="Candle Period",
+                xaxis_title="Step",
                 yaxis_title="Price",
                 height=400,
                 xaxis_rangeslider_visible=False,
@@ -2,13 +2,13 @@ import mesa
 from mesa import Agent, Model
 from mesa.time import RandomActivation
 import matplotlib.pyplot as plt
+import numpy as np
 
 
 def compute_gini(model):
-    agent_wealths = [agent.wealth for agent in model.schedule.agents]
-    x = sorted(agent_wealths)
+    x = np.sort([agent.wealth for agent in model.schedule.agents])
     N = model.num_agents
-    B = sum(xi * (N-i) for i, xi in enumerate(x)) / (N*sum(x))
+    B = (x * (N - np.arange(N))).sum() / (N * x.sum())
     return (1 + (1/N) - 2*B)
 
 
@@ -0,0 +1,406 @@
+import multiprocessing
+import weakref
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from ArrayGrid import ArrayGrid, neighbourhood_offsets
+from NeighbourIndex import NeighbourWealthIndex, prefer_dense
+from Portfolio import Portfolio
+from VectorizedModel import AT, CC, COPY_COOLDOWN, VectorizedModel
+
+
+# Per-agent strategy state of VectorizedModel
+AGENT_ARRAYS = [
+    "wealth", "strategy", "trades_completed", "interactions", "fees_paid",
+    "copied", "copy_cooldown", "ra_history", "ra_count", "fear",
+    "q_slot", "q_table", "last_state", "last_action", "last_wealth",
+]
+
+# Arrays kept in shared memory, by attribute path on the model
+SHARED_STATE = AGENT_ARRAYS + [
+    "portfolio.quantities", "portfolio.units", "grid._x", "grid._y"]
+
+# Orders of the current step, one row per slot (agent id rows of the tile
+# that placed them); order_agent -1 marks an empty row
+ORDER_BUFFERS = {"order_agent": np.int64, "order_asset": np.int64,
+                 "order_side": np.int8, "order_price": np.float64}
+
+# Ghost rows exchanged with each neighbouring strip: Copycat looks up to
+# two cells away
+HALO = 2
+
+# Strips per DistributedModel unless given: results depend on it, so it is
+# fixed rather than taken from the host's core count
+DEFAULT_TILES = 4
+
+
+def _resolve(obj, path):
+    for name in path.split("."):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _rebind(obj, path, value):
+    *parents, name = path.split(".")
+    for parent in parents:
+        obj = getattr(obj, parent)
+    setattr(obj, name, value)
+
+
+class SharedArrays:
+    """Named NumPy arrays in shared memory blocks.
+
+    Created from a dict of arrays (copied in) in the parent; worker
+    processes attach to the same blocks with SharedArrays(spec=...).
+    """
+
+    def __init__(self, arrays=None, spec=None):
+        self._owner = arrays is not None
+        self._blocks = {}
+        self.arrays = {}
+        if self._owner:
+            for name, array in arrays.items():
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                view = np.ndarray(array.shape, array.dtype, buffer=block.buf)
+                view[...] = array
+                self._blocks[name], self.arrays[name] = block, view
+        else:
+            for name, (block_name, shape, dtype) in spec.items():
+                block = shared_memory.SharedMemory(name=block_name)
+                self._blocks[name] = block
+                self.arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+    def spec(self):
+        return {name: (self._blocks[name].name, array.shape, array.dtype.str)
+                for name, array in self.arrays.items()}
+
+    def close(self):
+        self.arrays = {}
+        for block in self._blocks.values():
+            if self._owner:
+                block.unlink()
+            try:
+                block.close()
+            except BufferError:  # views still held elsewhere; unmapped with them
+                pass
+        self._blocks = {}
+
+
+class _TileLedger:
+    """The part of the Market the strategy kernels use inside a worker."""
+
+    def __init__(self, transaction_cost):
+        self.transaction_cost = transaction_cost
+        self.total_fees_collected = 0.0
+
+
+class TileWorker(VectorizedModel):
+    """One horizontal strip of a DistributedModel, stepped in a worker process.
+
+    Works directly on the shared agent arrays and reuses VectorizedModel's
+    interaction rounds and strategy kernels for the agents in its strip.
+    Agents only ever trade with cellmates, so a strip never writes to
+    another strip's agents. Each step:
+
+    1. its agents move to a random Moore neighbour cell,
+    2. agents that left the strip are handed to the neighbouring strip
+       (migration), and the agents in the strip's top and bottom HALO
+       rows are sent, with their position and wealth, to the strips
+       above and below (ghost cells),
+    3. every agent meets a random distinct cellmate in its new cell and
+       the pairs run in a random order, as in VectorizedModel,
+    4. Copycat looks neighbours up in an index over the strip and its
+       ghost rows,
+    5. the placed orders are written to the shared order buffers.
+    """
+
+    def __init__(self, tile, bounds, width, height, arrays, initial_wealth,
+                 transaction_cost, rng, inboxes):
+        self.tile = tile
+        self.n_tiles = len(bounds) - 1
+        self.y0, self.y1 = bounds[tile], bounds[tile + 1]
+        self.width = width
+        self.height = height
+        self.initial_wealth = initial_wealth
+        self.rng = rng
+        self.market = _TileLedger(transaction_cost)
+        self._inboxes = inboxes
+
+        for name in AGENT_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.portfolio = Portfolio(0, arrays["portfolio.quantities"].shape[1])
+        self.portfolio.quantities = arrays["portfolio.quantities"]
+        self.portfolio.units = arrays["portfolio.units"]
+        self.x, self.y = arrays["grid._x"], arrays["grid._y"]
+        for name in ORDER_BUFFERS:
+            setattr(self, name, arrays[name])
+        self.num_agents = len(self.wealth)
+        self._orders = []
+
+        self._moves = np.array(neighbourhood_offsets(width, height, 1), dtype=np.int64)
+        self.own = np.flatnonzero((self.y >= self.y0) & (self.y < self.y1))
+        rows = self.y1 - self.y0
+        expected = self.num_agents * rows // height
+        self._neighbours = NeighbourWealthIndex(
+            width, rows + 2 * HALO, radius=2,
+            dense=prefer_dense(width * (rows + 2 * HALO), expected))
+        self._ghosts = None
+        self._neighbours_built = False
+
+    def step(self, view):
+        """One step of the strip; returns the fees its agents paid."""
+        self._prices, self._means, self._trends = view
+        self._move()
+        self._exchange_halo()
+        initiators, partners = self._pair()
+        self._run_rounds(initiators, partners)
+        self._post_orders()
+        fees, self.market.total_fees_collected = self.market.total_fees_collected, 0.0
+        return fees
+
+    # ---- Halo exchange ----
+
+    def _send(self, direction, payload):
+        """Put `payload` in the inbox of the strip above (0) or below (1)."""
+        if direction == 0:
+            self._inboxes[(self.tile - 1) % self.n_tiles][1].put(payload)
+        else:
+            self._inboxes[(self.tile + 1) % self.n_tiles][0].put(payload)
+
+    def _receive(self):
+        """Payloads from the strips above and below."""
+        from_above, from_below = self._inboxes[self.tile]
+        return from_above.get(), from_below.get()
+
+    def _move(self):
+        own = self.own
+        step = self._moves[self.rng.integers(0, len(self._moves), len(own))]
+        self.x[own] = (self.x[own] + step[:, 0]) % self.width
+        y = (self.y[own] + step[:, 1]) % self.height
+        self.y[own] = y
+
+        # Agents move one row at most, so leavers go to an adjacent strip
+        inside = (y >= self.y0) & (y < self.y1)
+        up = ~inside & ((self.y0 - y) % self.height == 1)
+        self._send(0, own[up])
+        self._send(1, own[~inside & ~up])
+        arrived_above, arrived_below = self._receive()
+        self.own = np.concatenate([own[inside], arrived_above, arrived_below])
+
+    def _exchange_halo(self):
+        own = self.own
+        y = self.y[own]
+        for direction, rows in ((0, y < self.y0 + HALO), (1, y >= self.y1 - HALO)):
+            ids = own[rows]
+            self._send(direction, (ids, self.x[ids], self.y[ids], self.wealth[ids]))
+        self._ghosts = self._receive()
+        self._neighbours_built = False
+
+    # ---- Pairing and Copycat ----
+
+    def _pair(self):
+        own = self.own
+        grid = ArrayGrid(self.width, self.y1 - self.y0, capacity=len(own))
+        grid.place_many(self.x[own], self.y[own] - self.y0)
+        # Everyone has moved, so each agent's cellmates are all in its new cell
+        a, o = grid.cellmate_pairs(grid.cells(), self.rng.permutation(len(own)), self.rng)
+        return own[a], own[o]
+
+    def _local_rows(self, ys, side):
+        """Rows of the strip's neighbour index (own rows start at HALO)."""
+        if side == "above":
+            return HALO - (self.y0 - ys) % self.height
+        if side == "below":
+            return self.y1 - self.y0 + HALO + (ys - self.y1) % self.height
+        return ys - self.y0 + HALO
+
+    def _wealthiest_neighbours(self, agents):
+        """(wealth, id) of the wealthiest agent within radius 2, ghosts included."""
+        if not self._neighbours_built:
+            (ids_a, xs_a, ys_a, w_a), (ids_b, xs_b, ys_b, w_b) = self._ghosts
+            own = self.own
+            self._neighbours.build(
+                np.concatenate([self.x[own], xs_a, xs_b]),
+                np.concatenate([self._local_rows(self.y[own], "own"),
+                                self._local_rows(ys_a, "above"),
+                                self._local_rows(ys_b, "below")]),
+                np.concatenate([self.wealth[own], w_a, w_b]),
+                np.concatenate([own, ids_a, ids_b]))
+            self._neighbours_built = True
+        return self._neighbours.query(self.x[agents],
+                                      self._local_rows(self.y[agents], "own"))
+
+    def _copycat(self, a):
+        """VectorizedModel._copycat, comparing against the neighbour's wealth
+        as indexed (a ghost's live wealth belongs to another process)."""
+        waiting = self.copy_cooldown[a] > 0
+        self.copy_cooldown[a[waiting]] -= 1
+
+        ready = a[~waiting]
+        if len(ready):
+            best_wealth, best = self._wealthiest_neighbours(ready)
+            ok = best >= 0
+            ok[ok] = ((best_wealth[ok] > self.wealth[ready[ok]])
+                      & (self.strategy[best[ok]] != CC))
+            self.copied[ready[ok]] = self.strategy[best[ok]]
+            self.copy_cooldown[ready[ok]] = COPY_COOLDOWN
+
+        copied = self.copied[a]
+        return np.where(copied < 0, AT, copied)
+
+    # ---- Orders ----
+
+    def _post_orders(self):
+        orders = self._take_orders()
+        if orders is None:
+            return
+        # At most one order per initiator, so the strip's own agent rows
+        # have room for all of them and never collide with other strips
+        rows = self.own[:len(orders[0])]
+        for name, values in zip(ORDER_BUFFERS, orders):
+            getattr(self, name)[rows] = values
+
+
+def _tile_main(conn, tile, bounds, width, height, spec, initial_wealth,
+               transaction_cost, rng, inboxes):
+    """Worker process: step one strip whenever the parent sends a market view."""
+    shared = SharedArrays(spec=spec)
+    worker = TileWorker(tile, bounds, width, height, shared.arrays, initial_wealth,
+                        transaction_cost, rng, inboxes)
+    # Ready: strips pick their agents from the positions before anyone moves
+    conn.send(0.0)
+    while True:
+        view = conn.recv()
+        if view is None:
+            break
+        try:
+            conn.send(worker.step(view))
+        except Exception as exc:
+            conn.send(exc)
+            break
+
+
+def _shutdown(workers, conns, shared):
+    for conn in conns:
+        try:
+            conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+    for worker in workers:
+        worker.join(timeout=5)
+        if worker.is_alive():
+            worker.terminate()
+    shared.close()
+
+
+class DistributedModel(VectorizedModel):
+    """VectorizedModel split across worker processes by spatial domain decomposition.
+
+    The torus is cut into `tiles` horizontal strips (DEFAULT_TILES unless
+    given), each stepped by its own process (see TileWorker). All agent
+    arrays live in shared memory, so agents crossing a strip edge migrate
+    by handing over their id; Copycat's radius-2 lookups read ghost rows
+    exchanged with the neighbouring strips. Strips place their orders in
+    a shared buffer which the parent submits to the Market once per step,
+    before running the usual market pipeline and data collection.
+
+    Differences from VectorizedModel: agents move all at once before
+    trading (cellmates are met in their new cells), and Copycat compares
+    against its neighbour's wealth at the start of trading. Runs are
+    reproducible for a given seed and number of tiles, so `tiles` is a run
+    parameter like any other and never taken from the host. Every strip needs
+    at least HALO rows. Call close() (or use the model as a context
+    manager) to stop the workers; the agent arrays stay readable.
+    """
+
+    def __init__(self, number_of_agents, width, height, strategy_mode,
+                 initial_wealth, asset_config="Gold:10,Silver:5",
+                 event_mode="None", recorder_path=None, recorder_format="parquet",
+                 collection=None, transaction_cost=0.02, seed=None, tiles=DEFAULT_TILES,
+                 recorder_overwrite=False, price_history_maxlen=None,
+                 price_history_dtype="float64"):
+        super().__init__(number_of_agents, width, height, strategy_mode,
+                         initial_wealth, asset_config, event_mode, recorder_path,
+                         recorder_format, collection, transaction_cost, seed,
+                         recorder_overwrite, price_history_maxlen,
+                         price_history_dtype)
+        self.tiles = max(1, min(tiles, height // HALO))
+        self.bounds = [height * t // self.tiles for t in range(self.tiles + 1)]
+
+        arrays = {name: _resolve(self, name) for name in SHARED_STATE}
+        for name, dtype in ORDER_BUFFERS.items():
+            arrays[name] = np.full(self.num_agents, -1, dtype=dtype)
+        self._shared = SharedArrays(arrays)
+        for name, array in self._shared.arrays.items():
+            _rebind(self, name, array)
+
+        ctx = multiprocessing.get_context()
+        inboxes = [(ctx.Queue(), ctx.Queue()) for _ in range(self.tiles)]
+        rngs = [streams.generator("agents") for streams in self.streams.spawn(self.tiles)]
+        self._conns, self._workers = [], []
+        for tile in range(self.tiles):
+            conn, child_conn = ctx.Pipe()
+            worker = ctx.Process(
+                target=_tile_main, daemon=True,
+                args=(child_conn, tile, self.bounds, width, height, self._shared.spec(),
+                      self.initial_wealth, self.market.transaction_cost, rngs[tile], inboxes))
+            worker.start()
+            self._conns.append(conn)
+            self._workers.append(worker)
+        self._finalizer = weakref.finalize(self, _shutdown, self._workers,
+                                           self._conns, self._shared)
+        self._gather()
+
+    def step(self):
+        """Advance the model by one step."""
+        if not self._finalizer.alive:
+            raise RuntimeError("DistributedModel has been closed")
+        view = self.market_view()
+        for conn in self._conns:
+            conn.send(view)
+        self.market.total_fees_collected += self._gather()
+
+        rows = np.flatnonzero(self.order_agent >= 0)
+        if len(rows):
+            self.market.submit_orders(self.order_agent[rows], self.order_asset[rows],
+                                      self.order_side[rows], self.order_price[rows],
+                                      np.ones(len(rows)))
+            self.order_agent[rows] = -1
+        self.grid._index = None
+        self._finish_step()
+
+    def _gather(self):
+        """Wait for every strip to finish the step; returns the fees paid."""
+        fees = 0.0
+        pending = list(self._conns)
+        while pending:
+            for conn in wait(pending):
+                pending.remove(conn)
+                try:
+                    result = conn.recv()
+                except EOFError:
+                    result = RuntimeError("A tile worker exited unexpectedly")
+                if isinstance(result, BaseException):
+                    # Its neighbours may be waiting on it for good
+                    self.close()
+                    raise result
+                fees += result
+        return fees
+
+    def close(self):
+        """Stop the workers, keeping private copies of the agent arrays."""
+        if not self._finalizer.alive:
+            return
+        for name in SHARED_STATE:
+            _rebind(self, name, _resolve(self, name).copy())
+        for name in ORDER_BUFFERS:
+            setattr(self, name, getattr(self, name).copy())
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
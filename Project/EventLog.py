@@ -0,0 +1,72 @@
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+
+ROOT = "financial"
+
+# One logger per event category; enable or silence each independently
+CATEGORIES = {
+    "trade": logging.getLogger(ROOT + ".trade"),          # completed trades (INFO)
+    "interest": logging.getLogger(ROOT + ".interest"),    # trade interest (DEBUG)
+    "model": logging.getLogger(ROOT + ".model"),          # setup notices (WARNING)
+}
+TRADE = CATEGORIES["trade"]
+INTEREST = CATEGORIES["interest"]
+MODEL = CATEGORIES["model"]
+
+# Quiet by default: trade events are dropped by a cached isEnabledFor()
+# check before any message is built
+logging.getLogger(ROOT).setLevel(logging.WARNING)
+
+_listener = None
+
+
+def set_category_level(category, level):
+    """Set the level of one category; False silences it entirely."""
+    if level is False:
+        level = logging.CRITICAL + 1
+    CATEGORIES[category].setLevel(level)
+
+
+def configure_logging(level=logging.INFO, categories=None, stream=None,
+                      fmt="%(message)s"):
+    """Send simulation events at `level` and above to `stream` (stdout).
+
+    categories: optional {category: level or False} overrides.
+    Records are handed to a queue and written by a background listener
+    thread, so the simulation never blocks on the output stream.
+    """
+    global _listener
+    stop_logging()
+
+    root = logging.getLogger(ROOT)
+    root.setLevel(level)
+    for category, category_level in (categories or {}).items():
+        set_category_level(category, category_level)
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter(fmt))
+    q = queue.SimpleQueue()
+    _listener = QueueListener(q, handler)
+    _listener.start()
+    root.addHandler(QueueHandler(q))
+    root.propagate = False
+
+
+def stop_logging():
+    """Flush pending events and detach the handler set up by configure_logging()."""
+    global _listener
+    root = logging.getLogger(ROOT)
+    for handler in list(root.handlers):
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    root.propagate = True
+
+
+atexit.register(stop_logging)
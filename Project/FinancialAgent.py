@@ -1,6 +1,10 @@
+import logging
+
 from mesa import Agent
 from Asset import Asset
+from EventLog import INTEREST, TRADE
 from strategies import create_strategy
+from TradeJournal import BUY, SELL, TRANSFER, FEE
 
 
 class FinancialAgent(Agent):
@@ -13,16 +17,14 @@ class FinancialAgent(Agent):
 
         super().__init__(unique_id, model)
 
-        self.wealth = wealth
+        # Set directly: the model counts agents in when it adds them
+        self._wealth = wealth
         self.initial_wealth = wealth
         self.strategy = create_strategy(strategy, wealth)
         self.mood = mood
-        self.history = []
-        self.assets = []
 
-        # Each agent starts with 1 unit of each asset defined in the market
-        for asset_name in self.model.market.get_asset_names():
-            self.assets.append(Asset(asset_name, 1))
+        # Holdings live in row `unique_id` of the model's Portfolio matrix;
+        # each agent starts with 1 unit of each asset defined in the market
 
         self.trades_completed = 0
         self.interactions = 0
@@ -30,24 +32,72 @@ class FinancialAgent(Agent):
         # Portfolio tracking
         self.fees_paid = 0.0
 
+    @property
+    def wealth(self):
+        return self._wealth
+
+    @wealth.setter
+    def wealth(self, value):
+        # Keep the model's wealth order and wealthy-agent count in step
+        model = self.model
+        model.wealth_index.set(self.unique_id, value)
+        if (value > 0) != (self._wealth > 0):
+            model._wealthy_count += 1 if value > 0 else -1
+        self._wealth = value
+
     @property
     def strategy_name(self):
         return self.strategy.name
 
+    @property
+    def history(self):
+        """This agent's retained moves and trades (see ActivityLog.py)."""
+        return self.model.activity.for_agent(self.unique_id)
+
+    @property
+    def holdings(self):
+        """Units held per asset, ordered like market.get_asset_names()."""
+        return self.model.portfolio.quantities[self.unique_id]
+
+    @property
+    def total_units(self):
+        return self.model.portfolio.total_units(self.unique_id)
+
+    @property
+    def assets(self):
+        """Held assets as aggregated Asset(name, quantity) records."""
+        names = self.model.market.asset_names
+        return [Asset(names[i], qty)
+                for i, qty in enumerate(self.holdings.tolist()) if qty > 0]
+
+    def owns(self, asset_name):
+        return self.holdings[self.model.market.asset_index[asset_name]] > 0
+
+    def random_asset(self):
+        """Name of a random held unit's asset (weighted by quantity), or None."""
+        total = self.total_units
+        if total == 0:
+            return None
+        asset_idx = self.model.portfolio.pick_unit(
+            self.unique_id, self.random.randrange(total))
+        return self.model.market.asset_names[asset_idx]
+
     @property
     def net_worth(self):
         """Cash + market value of all held assets."""
-        asset_value = sum(
-            self.model.market.get_price(a.name) * a.quantity
-            for a in self.assets
-        )
-        return self.wealth + asset_value
+        return self.wealth + self.model.portfolio.value(
+            self.unique_id, self.model.market.price_vector())
 
     def _pay_fee(self, trade_value):
         """Deduct transaction fee from wealth. Returns the fee paid."""
         fee = self.model.market.calculate_fee(trade_value)
         self.wealth -= fee
         self.fees_paid += fee
+
+        journal = self.model.journal
+        if journal is not None:
+            journal.record(self.model.schedule.time, self.unique_id, -1, -1,
+                           FEE, trade_value, 0, fee)
         return fee
 
     def step(self):
@@ -69,13 +119,19 @@ class FinancialAgent(Agent):
         new_pos = self.random.choice(possible_steps)
         self.model.grid.move_agent(self, new_pos)
 
-        self.history.append({'time': self.model.schedule.time,
-                             'activity': 'move',
-                             'old_pos': old_pos,
-                             'new_pos': new_pos})
+        activity = self.model.activity
+        if activity.enabled:
+            activity.log_move(self.model.schedule.time, self.unique_id,
+                              old_pos, new_pos)
 
     def trade(self):
         """Trade with a random agent in the same cell."""
+        other = self.pick_cellmate()
+        if other is not None:
+            self.trade_with(other)
+
+    def pick_cellmate(self):
+        """A random other agent in the same cell, or None."""
         cellmates = self.model.grid.get_cell_list_contents([self.pos])
 
         if len(cellmates) > 1:
@@ -84,51 +140,111 @@ class FinancialAgent(Agent):
             while (other.unique_id == self.unique_id):
                 other = self.random.choice(cellmates)
 
-            self.interactions += 1
+            return other
+        return None
+
+    def trade_with(self, other):
+        """Run one strategy interaction with `other`."""
+        self.interactions += 1
+
+        self.strategy.execute(self, other)
+
+        self.log_trade(other)
+
+    def decide_with(self, other):
+        """Decide an interaction with `other` without trading: its TradeIntents.
 
-            self.strategy.execute(self, other)
+        Counts the interaction and may update this agent's strategy state
+        and mood, but changes nothing about `other` or the market.
+        """
+        self.interactions += 1
+        return self.strategy.decide(self, other)
 
-            self.history.append({'time': self.model.schedule.time,
-                                 'activity': 'trade',
-                                 'other': other.unique_id,
-                                 'wealth': self.wealth,
-                                 'other_wealth': other.wealth})
+    def log_trade(self, other):
+        activity = self.model.activity
+        if activity.enabled:
+            activity.log_trade(self.model.schedule.time, self.unique_id,
+                               other.unique_id, self.pos,
+                               self.wealth, other.wealth)
 
     # ---- Trade execution helpers (used by strategies) ----
 
+    def apply_intent(self, intent):
+        """Carry out one of this agent's TradeIntents immediately."""
+        if intent.kind == BUY:
+            self.execute_buy(intent.other, intent.asset)
+            if intent.fee:
+                self._pay_fee(intent.price)
+        elif intent.kind == SELL:
+            self.execute_sell(intent.other, intent.asset)
+        else:
+            self.execute_transfer(intent.other, intent.price)
+
+            if TRADE.isEnabledFor(logging.INFO):
+                TRADE.info("%s%d traded %d units of wealth with %s%d.",
+                           self._AGENT_PREFIX, self.unique_id, intent.price,
+                           self._AGENT_PREFIX, intent.other.unique_id)
+
+            self.trades_completed += 1
+
     def execute_buy(self, other, asset):
-        """Buy an asset from another agent at market price."""
-        price = self.model.market.get_price(asset.name)
-        self.assets.append(asset)
-        other.assets.remove(asset)
+        """Buy one unit of the named asset from another agent at market price."""
+        market = self.model.market
+        price = market.get_price(asset)
+        self.model.portfolio.transfer(
+            other.unique_id, self.unique_id, market.asset_index[asset])
         other.wealth += price
         self.wealth -= price
 
-        self.model.market.submit_order(
-            self.unique_id, asset.name, "bid", price)
+        market.submit_order(self.unique_id, asset, "bid", price)
+        self._journal_trade(BUY, other, asset, price)
         self.confirm_trade(other, asset)
 
     def execute_sell(self, other, asset):
-        """Sell an asset to another agent at market price."""
-        price = self.model.market.get_price(asset.name)
-        other.assets.append(asset)
-        self.assets.remove(asset)
+        """Sell one unit of the named asset to another agent at market price."""
+        market = self.model.market
+        price = market.get_price(asset)
+        self.model.portfolio.transfer(
+            self.unique_id, other.unique_id, market.asset_index[asset])
         self.wealth += price
         other.wealth -= price
 
-        self.model.market.submit_order(
-            other.unique_id, asset.name, "ask", price)
+        market.submit_order(self.unique_id, asset, "ask", price)
+        self._journal_trade(SELL, other, asset, price)
         self.trades_completed += 1
 
+    def execute_transfer(self, other, amount):
+        """Give `amount` of wealth to another agent."""
+        other.wealth += amount
+        self.wealth -= amount
+
+        journal = self.model.journal
+        if journal is not None:
+            journal.record(self.model.schedule.time, self.unique_id,
+                           other.unique_id, -1, TRANSFER, amount, 0)
+
+    def _journal_trade(self, side, other, asset_name, price):
+        journal = self.model.journal
+        if journal is not None:
+            journal.record(self.model.schedule.time, self.unique_id, other.unique_id,
+                           self.model.market.asset_index[asset_name], side, price)
+
     def print_interest(self, other, asset):
-        print(self._AGENT_PREFIX + str(self.unique_id) + " is interested in trading for " +
-              str(asset.name) + " with " + self._AGENT_PREFIX + str(other.unique_id) + ".")
+        if INTEREST.isEnabledFor(logging.DEBUG):
+            INTEREST.debug("%s%d is interested in trading for %s with %s%d.",
+                           self._AGENT_PREFIX, self.unique_id, asset,
+                           self._AGENT_PREFIX, other.unique_id)
 
     def confirm_trade(self, other, asset):
-        asset_price = self.model.market.get_price(asset.name)
-        print(self._AGENT_PREFIX + str(self.unique_id) + " traded " + str(asset.name) + " with " +
-              self._AGENT_PREFIX + str(other.unique_id) + " for " + str(asset_price) + " units of wealth.")
+        if TRADE.isEnabledFor(logging.INFO):
+            TRADE.info("%s%d traded %s with %s%d for %s units of wealth.",
+                       self._AGENT_PREFIX, self.unique_id, asset,
+                       self._AGENT_PREFIX, other.unique_id,
+                       self.model.market.get_price(asset))
         self.trades_completed += 1
 
     def set_strategy(self, strategy_name):
+        counts = self.model._strategy_counts
+        counts[self.strategy.name] -= 1
         self.strategy = create_strategy(strategy_name, self.initial_wealth)
+        counts[self.strategy.name] += 1
@@ -1,16 +1,34 @@
+import copy
+
 from mesa import Model
 from FinancialAgent import FinancialAgent
 from mesa.time import RandomActivation
 from mesa.space import MultiGrid
-from mesa.datacollection import DataCollector
+from ArrayGrid import ArrayGrid
+from SparseGrid import SparseGrid
+from ActivityLog import ActivityLog
+from Checkpoint import save_checkpoint, load_checkpoint
+from EventLog import MODEL
 from Market import Market
 from MarketEvent import MarketEvent
+from MetricsCollector import MetricsCollector
+from NeighbourIndex import NeighbourWealthIndex, prefer_dense
+from Portfolio import Portfolio
+from RandomStreams import RandomStreams
+from Recorder import Recorder
+from Settlement import settle
 from strategies import STRATEGY_NAMES
+from TradeJournal import TradeJournal, DEPOSIT, HOLDING, TICK
+from WealthIndex import WealthIndex
 import numpy as np
 
 
 STRATEGIES = STRATEGY_NAMES
 
+GRID_BACKENDS = ["multigrid", "array", "sparse"]
+
+STEP_MODES = ["sequential", "two_phase"]
+
 PREDEFINED_EVENTS = {
     "Market Crash": {"event_type": "crash", "magnitude": 0.5, "duration": 10},
     "Bull Run": {"event_type": "boom", "magnitude": 1.8, "duration": 15},
@@ -18,32 +36,149 @@ PREDEFINED_EVENTS = {
 }
 
 
+def parse_asset_config(config_str):
+    """Parse 'Gold:10,Silver:5' into list of dicts."""
+    assets = []
+    for item in config_str.split(","):
+        parts = item.strip().split(":")
+        if len(parts) == 2:
+            assets.append({
+                "name": parts[0].strip(),
+                "initial_price": float(parts[1].strip())
+            })
+    return assets
+
+
+def create_event(event_name, rng=None):
+    """Build and activate one of PREDEFINED_EVENTS, drawing shocks from `rng`."""
+    cfg = PREDEFINED_EVENTS[event_name]
+    event = MarketEvent(
+        name=event_name,
+        event_type=cfg["event_type"],
+        magnitude=cfg["magnitude"],
+        duration=cfg["duration"],
+        rng=rng
+    )
+    event.activate()
+    return event
+
+
+def strategy_fluctuation(mr_count, mm_count, total):
+    """Market-wide price shift implied by the strategy distribution."""
+    if total == 0:
+        return 0.0
+
+    # Weighted fluctuation based on strategy distribution
+    fluctuation = 0.0
+    if mr_count > 0:
+        fluctuation += (-0.1) * (mr_count / total)
+    if mm_count > 0:
+        fluctuation += (0.05) * (mm_count / total)
+    return fluctuation
+
+
 class FinancialModel(Model):
 
     """A model with some number of agents."""
 
     def __init__(self, number_of_agents, width, height, strategy_mode,
                  initial_wealth, asset_config="Gold:10,Silver:5",
-                 event_mode="None"):
+                 event_mode="None", journal_path=None,
+                 history_mode="off", history_size=100_000, history_sample=10,
+                 grid_backend="multigrid", recorder_path=None,
+                 recorder_format="parquet", collection=None,
+                 transaction_cost=0.02, seed=None, step_mode="sequential",
+                 recorder_overwrite=False, price_history_maxlen=None,
+                 price_history_dtype="float64"):
+        # Every draw comes from streams spawned from `seed` (see
+        # RandomStreams.py). Agent-level scalar draws (activation order,
+        # moves, partner, strategy and asset choice) go through Mesa's
+        # self.random, which is seeded from the "agents" stream
+        self.streams = RandomStreams(seed)
+        self.random.seed(self.streams.random_seed("agents"))
 
         self.num_agents = number_of_agents
 
-        self.grid = MultiGrid(width, height, True)
+        # "multigrid": Mesa's MultiGrid, agents move and trade one by one.
+        # "array": ArrayGrid, moves and cellmate pairing run as batches
+        # "sparse": SparseGrid, stores only occupied cells (huge worlds)
+        if grid_backend not in GRID_BACKENDS:
+            raise ValueError(f"Unknown grid backend {grid_backend!r} "
+                             f"(expected one of {GRID_BACKENDS})")
+        self.grid_backend = grid_backend
+        if grid_backend == "array":
+            self.grid = ArrayGrid(width, height, True)
+            self.grid_rng = self.streams.generator("grid")
+        elif grid_backend == "sparse":
+            self.grid = SparseGrid(width, height, True)
+        else:
+            self.grid = MultiGrid(width, height, True)
 
         self.strategy_mode = strategy_mode
 
+        # "sequential": each agent trades in turn and sees earlier trades.
+        # "two_phase": all agents decide against the same snapshot, then
+        # the intents are settled together (see Settlement.py)
+        if step_mode not in STEP_MODES:
+            raise ValueError(f"Unknown step mode {step_mode!r} "
+                             f"(expected one of {STEP_MODES})")
+        self.step_mode = step_mode
+
         self.schedule = RandomActivation(self)
 
         if self.num_agents > self.grid.width * self.grid.height:
-            print("Number of agents is bigger than the number of cells. "
-                  "Reducing to " + str(self.grid.width * self.grid.height) + ".")
+            MODEL.warning("Number of agents is bigger than the number of cells. "
+                          "Reducing to %d.", self.grid.width * self.grid.height)
             self.num_agents = self.grid.width * self.grid.height
 
-        # Initialize the market with configurable assets
-        self.market = Market(self._parse_asset_config(asset_config))
+        # Initialize the market with configurable assets. Price histories
+        # keep the last price_history_maxlen ticks (None or 0: every tick)
+        # as float64 or float32
+        asset_configs = self._parse_asset_config(asset_config)
+        self.market = Market(asset_configs, transaction_cost,
+                             history_dtype=price_history_dtype,
+                             history_maxlen=price_history_maxlen or None,
+                             rng=self.streams.generator("market"))
+
+        # Optional append-only trade journal (see TradeJournal.py)
+        self.journal = None
+        if journal_path is not None:
+            self.journal = TradeJournal(journal_path, asset_configs,
+                                        self.market.transaction_cost)
+
+        # Optional on-disk stream of the collected series (see Recorder.py)
+        self.recorder = None
+        if recorder_path is not None:
+            self.recorder = Recorder(recorder_path, recorder_format,
+                                     overwrite=recorder_overwrite)
+        self.collection = collection
+
+        # Wealthiest agent within radius 2 of each cell, rebuilt once per
+        # step on first use (see wealthiest_neighbour). Dense unless the
+        # world is much larger than the population
+        self._neighbour_index = NeighbourWealthIndex(
+            width, height, radius=2,
+            dense=prefer_dense(width * height, self.num_agents))
+        self._neighbour_index_time = None
+
+        # Agent move/trade history: "off", "ring" (last history_size
+        # records) or "sampled" (last history_size records of every
+        # history_sample-th step)
+        self.activity = ActivityLog(history_mode, history_size, history_sample)
+
+        # Holdings of all agents: one row per agent, one unit of each asset
+        self.portfolio = Portfolio(self.num_agents, len(asset_configs))
+
+        # Live population counts and wealth order, kept up to date by
+        # create_agents, FinancialAgent.set_strategy and the
+        # FinancialAgent.wealth setter
+        self._strategy_counts = dict.fromkeys(STRATEGIES, 0)
+        self._wealthy_count = 0
+        self.wealth_index = WealthIndex()
 
         # Create agents (each gets a strategy based on strategy_mode)
         self.create_agents(self.num_agents, initial_wealth)
+        self._journal_opening_balances()
 
         # Setup market events
         self.events = []
@@ -56,16 +191,7 @@ class FinancialModel(Model):
         self.total_wealth = self.compute_total_wealth()
 
     def _parse_asset_config(self, config_str):
-        """Parse 'Gold:10,Silver:5' into list of dicts."""
-        assets = []
-        for item in config_str.split(","):
-            parts = item.strip().split(":")
-            if len(parts) == 2:
-                assets.append({
-                    "name": parts[0].strip(),
-                    "initial_price": float(parts[1].strip())
-                })
-        return assets
+        return parse_asset_config(config_str)
 
     def _assign_strategy(self, agent_index):
         """Assign a strategy to an agent based on strategy_mode."""
@@ -80,76 +206,168 @@ class FinancialModel(Model):
     def _setup_events(self, event_mode):
         """Activate a predefined market event if selected."""
         if event_mode != "None" and event_mode in PREDEFINED_EVENTS:
-            cfg = PREDEFINED_EVENTS[event_mode]
-            event = MarketEvent(
-                name=event_mode,
-                event_type=cfg["event_type"],
-                magnitude=cfg["magnitude"],
-                duration=cfg["duration"]
-            )
-            event.activate()
-            self.events.append(event)
+            self.trigger_event(event_mode)
+
+    def trigger_event(self, event_name):
+        """Activate one of PREDEFINED_EVENTS from the next step on."""
+        event = create_event(event_name, self.streams.uniforms("events"))
+        self.events.append(event)
+        return event
+
+    def _journal_opening_balances(self):
+        if self.journal is None:
+            return
+        for agent in self.schedule.agents:
+            self.journal.record(0, agent.unique_id, -1, -1, DEPOSIT, agent.wealth, 0)
+            for asset in agent.assets:
+                self.journal.record(0, agent.unique_id, -1,
+                                    self.market.asset_index[asset.name],
+                                    HOLDING, 0, asset.quantity)
 
     def step(self):
         """Advance the model by one step."""
-        self.schedule.step()
-
-        # Apply price fluctuations once per step (not per agent)
+        step_index = self.schedule.time
+        if self.step_mode == "two_phase":
+            self._step_agents_two_phase()
+        elif self.grid_backend == "array":
+            self._step_agents_batched()
+        else:
+            self.schedule.step()
+
+        # Apply price fluctuations once per step (not per agent). This and
+        # the stages below only adjust pending prices until commit_tick()
         self._apply_price_fluctuations()
 
-        # Settle the order book for each asset
-        for asset_name in self.market.get_asset_names():
-            self.market.clear_orders(asset_name)
-
-        # Close candles every 5 steps for OHLC chart
-        if self.schedule.time > 0 and self.schedule.time % 5 == 0:
-            for asset_name in self.market.get_asset_names():
-                self.market.close_candle(asset_name)
+        # Settle the order book for all assets in one batched pass
+        self.market.clear_orders()
 
         # Apply active market events
         self.events = [e for e in self.events if e.tick(self.market)]
 
+        # Commit exactly one price tick per asset for this step
+        prices, volumes = self.market.commit_tick()
+        if self.journal is not None:
+            self.journal.record_many(step_index, -1, -1, np.arange(len(prices)),
+                                     TICK, prices, volumes)
+
         self.collect_data()
 
+    def _step_agents_batched(self):
+        """One RandomActivation step with moves and pairing done as batches.
+
+        Agents still trade one by one in a random order, each with a
+        cellmate drawn as it would have found them at its turn. Copycat
+        neighbourhoods see every agent at its new position.
+        """
+        grid = self.grid
+        order = [grid.slot(a) for a in self.schedule.agent_buffer(shuffled=True)]
+        priority = np.empty(len(order), dtype=np.int64)
+        priority[order] = np.arange(len(order))
+
+        old_cell = grid.move_random(self.grid_rng)
+        if self.activity.enabled:
+            self.activity.log_moves(
+                self.schedule.time, [a.unique_id for a in grid.agents],
+                old_cell % grid.width, old_cell // grid.width, grid.x, grid.y)
+
+        initiators, partners = grid.cellmate_pairs(old_cell, priority, self.grid_rng)
+        agents = grid.agents
+        for a, o in zip(initiators.tolist(), partners.tolist()):
+            agent = agents[a]
+            if agent.wealth > 0:
+                agent.trade_with(agents[o])
+
+        self.schedule.steps += 1
+        self.schedule.time += 1
+
+    def _step_agents_two_phase(self):
+        """One step as a decide phase and a settle phase.
+
+        All agents move, then every agent with wealth picks a cellmate and
+        decides its trades. Deciding changes nothing but the decider's own
+        strategy state, so each agent sees the same frozen market and
+        counterparties whatever the order (which is what makes the
+        decisions independent of each other). Settlement then resolves
+        conflicting intents in activation order and applies the rest in
+        bulk.
+        """
+        agents = list(self.schedule.agent_buffer(shuffled=True))
+        if self.grid_backend == "array":
+            grid = self.grid
+            old_cell = grid.move_random(self.grid_rng)
+            if self.activity.enabled:
+                self.activity.log_moves(
+                    self.schedule.time, [a.unique_id for a in grid.agents],
+                    old_cell % grid.width, old_cell // grid.width, grid.x, grid.y)
+        else:
+            for agent in agents:
+                agent.move()
+
+        # ---- Decide ----
+        pairs = []
+        intents = []
+        for agent in agents:
+            if agent.wealth > 0:
+                other = agent.pick_cellmate()
+                if other is not None:
+                    pairs.append((agent, other))
+                    intents.extend(agent.decide_with(other))
+
+        # ---- Settle ----
+        settle(self, intents)
+        if self.activity.enabled:
+            for agent, other in pairs:
+                agent.log_trade(other)
+
+        self.schedule.steps += 1
+        self.schedule.time += 1
+
     def _apply_price_fluctuations(self):
         """Apply market-wide price fluctuations based on agent strategy distribution."""
         if self.schedule.time % 10 != 0 or self.schedule.time == 0:
             return
 
-        # Count strategies in use
-        mr_count = sum(1 for a in self.schedule.agents if a.strategy_name == "Mean Reversion")
-        mm_count = sum(1 for a in self.schedule.agents if a.strategy_name == "Momentum")
-        total = self.num_agents
-
-        if total == 0:
-            return
-
-        # Weighted fluctuation based on strategy distribution
-        fluctuation = 0.0
-        if mr_count > 0:
-            fluctuation += (-0.1) * (mr_count / total)
-        if mm_count > 0:
-            fluctuation += (0.05) * (mm_count / total)
-
+        fluctuation = strategy_fluctuation(self.count_strategy("Mean Reversion"),
+                                           self.count_strategy("Momentum"),
+                                           self.num_agents)
         if fluctuation != 0.0:
-            for asset_name in self.market.get_asset_names():
-                current = self.market.get_price(asset_name)
-                self.market.update_price(asset_name, current + fluctuation)
+            self.market.stage_shift(None, fluctuation)
 
     def create_agents(self, number_of_agents, initial_wealth):
-        for i in range(self.num_agents):
+        # Distinct starting cells, sampled without replacement in O(N)
+        width = self.grid.width
+        cells = self.random.sample(range(width * self.grid.height), self.num_agents)
+
+        for i, cell in enumerate(cells):
             strategy = self._assign_strategy(i)
             a = FinancialAgent(i, self, initial_wealth, strategy, "neutral")
             self.schedule.add(a)
-
-            x = self.random.randrange(self.grid.width)
-            y = self.random.randrange(self.grid.height)
-
-            while not self.grid.is_cell_empty((x, y)):
-                x = self.random.randrange(self.grid.width)
-                y = self.random.randrange(self.grid.height)
-
-            self.grid.place_agent(a, (x, y))
+            self.grid.place_agent(a, (cell % width, cell // width))
+            self._strategy_counts[a.strategy_name] += 1
+            if a.wealth > 0:
+                self._wealthy_count += 1
+            self.wealth_index.set(a.unique_id, a.wealth)
+
+    def count_strategy(self, strategy_name) -> int:
+        """Number of agents currently using strategy_name."""
+        return self._strategy_counts.get(strategy_name, 0)
+
+    def wealthiest_neighbour(self, pos):
+        """Wealthiest agent within radius 2 of pos (own cell excluded), or None.
+
+        Neighbours are ranked by a snapshot of positions and wealth taken
+        the first time this is called in a step.
+        """
+        if self._neighbour_index_time != self.schedule.time:
+            agents = self.schedule.agents
+            self._neighbour_index.build([a.pos[0] for a in agents],
+                                        [a.pos[1] for a in agents],
+                                        [a.wealth for a in agents],
+                                        np.arange(len(agents)))
+            self._neighbour_agents = agents
+            self._neighbour_index_time = self.schedule.time
+        _, best = self._neighbour_index.query(pos[0], pos[1])
+        return None if best < 0 else self._neighbour_agents[best]
 
     def agent_wealth_labels_and_colors(self):
         labels_and_colors = []
@@ -160,29 +378,22 @@ class FinancialModel(Model):
 
     def compute_gini(self):
         """Compute the Gini coefficient of the model."""
-        agent_wealths = [agent.wealth for agent in self.schedule.agents]
-        x = sorted(agent_wealths)
-        N = self.num_agents
-        total = sum(x)
-        if N == 0 or total == 0:
-            return 0
-        B = sum(xi * (N - i) for i, xi in enumerate(x)) / (N * total)
-        return (1 + (1 / N) - 2 * B)
+        return self.wealth_index.gini()
 
     def get_wealthiest_agent(self):
-        return max([agent.wealth for agent in self.schedule.agents])
+        return self.wealth_index.max()
 
     def compute_avg_wealth(self):
-        return np.mean([agent.wealth for agent in self.schedule.agents])
+        return self.wealth_index.mean()
 
     def current_wealthy_agents(self) -> int:
-        return sum(1 for agent in self.schedule.agents if agent.wealth > 0)
+        return self._wealthy_count
 
     def current_non_wealthy_agents(self) -> int:
-        return sum(1 for agent in self.schedule.agents if agent.wealth <= 0)
+        return self.num_agents - self._wealthy_count
 
     def compute_total_wealth(self):
-        return sum([agent.wealth for agent in self.schedule.agents])
+        return self.wealth_index.total
 
     def compute_total_trades(self):
         return sum([agent.trades_completed for agent in self.schedule.agents])
@@ -190,72 +401,98 @@ class FinancialModel(Model):
     def compute_total_interactions(self):
         return sum([agent.interactions for agent in self.schedule.agents])
 
-    def initalize_data_collectors(self):
+    def agent_state(self):
+        """(ids, wealth, trades, interactions) of all agents, read in one pass."""
+        state = np.array([(a.unique_id, a.wealth, a.trades_completed, a.interactions)
+                          for a in self.schedule.agents], dtype=np.float64).reshape(-1, 4)
+        return (state[:, 0].astype(np.int64), state[:, 1],
+                state[:, 2].astype(np.int64), state[:, 3].astype(np.int64))
 
-        self.datacollector_gini = DataCollector(
-            model_reporters={"Gini": self.compute_gini},
-            agent_reporters={"Wealth": "wealth"}
-        )
-
-        self.datacollector_wealthiest_agent = DataCollector(
-            model_reporters={"Wealthiest Agent": self.get_wealthiest_agent}
-        )
-
-        self.datacollector_currents = DataCollector(
-            {
-                "Wealthy Agents": self.current_wealthy_agents,
-                "Non Wealthy Agents": self.current_non_wealthy_agents,
-            }
-        )
-
-        self.datacollector_total_wealth = DataCollector(
-            model_reporters={"Total Wealth": self.compute_total_wealth},
-            agent_reporters={"Wealth": "wealth"}
-        )
-
-        self.datacollector_trades = DataCollector(
-            model_reporters={"Total Trades": self.compute_total_trades},
-            agent_reporters={"Trades": "trades_completed"}
-        )
-
-        self.datacollector_interactions = DataCollector(
-            model_reporters={
-                "Total Interactions": self.compute_total_interactions},
-            agent_reporters={"Interactions": "interactions"}
-        )
-
-        self.datacollector_agent_wealth = DataCollector(
-            agent_reporters={"Wealth": lambda a: a.wealth}
-        )
-
-        # Market price tracking
-        market_reporters = {}
-        for asset_name in self.market.get_asset_names():
-            # Use default arg to capture asset_name in closure
-            market_reporters[asset_name + " Price"] = (
-                lambda m, name=asset_name: m.market.get_price(name)
-            )
-        self.datacollector_market_prices = DataCollector(
-            model_reporters=market_reporters
-        )
-
-        # Strategy distribution tracking
-        strategy_reporters = {}
-        for strat in STRATEGIES:
-            strategy_reporters[strat] = (
-                lambda m, s=strat: sum(1 for a in m.schedule.agents if a.strategy_name == s)
-            )
-        self.datacollector_strategies = DataCollector(
-            model_reporters=strategy_reporters
-        )
+    def initalize_data_collectors(self):
+        """One fused collector, exposed under the datacollector_* names."""
+        # Agent series go to the recorder instead of memory when there is one;
+        # `collection` decides which steps and agents are kept
+        self.metrics = MetricsCollector(self.market.get_asset_names(), STRATEGIES,
+                                        agent_series=self.recorder is None,
+                                        recorder=self.recorder,
+                                        policies=self.collection,
+                                        rng=self.streams.generator("collector"))
+        for name, view in self.metrics.views().items():
+            setattr(self, name, view)
 
     def collect_data(self):
-        self.datacollector_gini.collect(self)
-        self.datacollector_wealthiest_agent.collect(self)
-        self.datacollector_currents.collect(self)
-        self.datacollector_total_wealth.collect(self)
-        self.datacollector_trades.collect(self)
-        self.datacollector_interactions.collect(self)
-        self.datacollector_agent_wealth.collect(self)
-        self.datacollector_market_prices.collect(self)
-        self.datacollector_strategies.collect(self)
+        self.metrics.collect(self, self.schedule.steps)
+
+    # ---- Checkpointing and scenario forks ----
+
+    def checkpoint(self, path):
+        """Save the complete model state to `path` (see Checkpoint.py)."""
+        save_checkpoint(self, path)
+
+    def close_journal(self):
+        """Flush and close the trade journal, if one is open."""
+        if self.journal is not None:
+            self.journal.close()
+
+    def resume_journal(self):
+        """Continue writing a restored model's journal where the checkpoint left it.
+
+        Anything the journal file gained after the checkpoint is dropped.
+        """
+        if self.journal is not None:
+            self.journal.resume()
+
+    def close_recorder(self):
+        """Flush the metrics recorder and finish its files, if there is one."""
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def resume_recorder(self):
+        """Continue a restored model's recording where the checkpoint left it.
+
+        Rows the recording gained after the checkpoint are dropped.
+        """
+        if self.recorder is not None:
+            self.recorder.resume()
+
+    @classmethod
+    def restore(cls, path, resume_journal=False, resume_recorder=False):
+        """Load a model saved with checkpoint() (see load_checkpoint)."""
+        model = load_checkpoint(path, resume_journal, resume_recorder)
+        if not isinstance(model, cls):
+            raise TypeError(f"{path} holds a {type(model).__name__}, not a {cls.__name__}")
+        return model
+
+    def fork(self, seed=None):
+        """Return an independent in-process copy of this model.
+
+        Price histories and already-collected agent records are shared
+        with the parent rather than copied, and are only duplicated when
+        one side writes to them. Pass a seed to give the fork its own
+        random stream; otherwise it replays the parent's draws. The fork
+        does not write to the parent's trade journal or metrics recorder:
+        a fork of a recording model keeps its agent series in memory
+        instead, from the fork on (earlier steps are only in the parent's
+        recording).
+        """
+        memo = {id(array): array for array in self.metrics.agent_arrays()}
+        # A journal file has a single writer; forks start without one
+        memo[id(self.journal)] = None
+        memo[id(self.recorder)] = None
+        clone = copy.deepcopy(self, memo)
+        if self.recorder is not None:
+            clone.metrics.agent_series = True
+        if seed is not None:
+            clone.reseed(seed)
+        return clone
+
+    def reseed(self, seed):
+        """Restart the model's random streams from `seed`."""
+        self.streams = RandomStreams(seed)
+        self.random.seed(self.streams.random_seed("agents"))
+        self.market.rng = self.streams.generator("market")
+        self.metrics.rng = self.streams.generator("collector")
+        for event in self.events:
+            event.rng = self.streams.uniforms("events")
+        if self.grid_backend == "array":
+            self.grid_rng = self.streams.generator("grid")
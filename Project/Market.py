@@ -1,81 +1,224 @@
-import random
+from collections import deque
+
+import numpy as np
+
+from OHLC import OHLCAggregator
+from OrderBook import OrderBook, Trade, BID, ASK
+from PriceHistory import PriceHistory
+
+
+class PriceStats:
+    """Running price statistics for one asset, updated once per price tick.
+
+    Keeps a cumulative mean and Welford variance over the full history,
+    a sliding window of returns for volatility and the last price move,
+    so no getter on Market depends on the history length.
+    """
+
+    def __init__(self, price, window=20):
+        self.window = window
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.last_price = None
+        self.trend = "stable"
+
+        # Returns over the last `window` prices (window - 1 returns), and
+        # their standard deviation once asked for in the current window
+        self._returns = deque(maxlen=max(window - 1, 1))
+        self._volatility = None
+
+        self.add(price)
+
+    def add(self, price):
+        """Fold a new price tick into all accumulators."""
+        # Welford update for cumulative mean/variance
+        self.count += 1
+        delta = price - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (price - self.mean)
+        self._push_price(price)
+
+    def _push_price(self, price):
+        """Update trend and the returns window with a new tick."""
+        if self.last_price is not None:
+            if price > self.last_price:
+                self.trend = "up"
+            elif price < self.last_price:
+                self.trend = "down"
+            else:
+                self.trend = "stable"
+
+            r = (price - self.last_price) / max(self.last_price, 0.01)
+            self._returns.append(r)
+            self._volatility = None
+
+        self.last_price = price
+
+    def extend(self, prices):
+        """Fold an array of ticks in at once (same result as add() per tick)."""
+        prices = np.asarray(prices, dtype=np.float64)
+        if len(prices) == 0:
+            return
+
+        # Chan et al. merge of (count, mean, M2) with the batch moments
+        n_b = len(prices)
+        mean_b = prices.mean()
+        m2_b = float(((prices - mean_b) ** 2).sum())
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        self._m2 += m2_b + delta * delta * self.count * n_b / n
+        self.mean += delta * n_b / n
+        self.count = n
+
+        # Only the last `window` ticks can still affect returns and trend
+        if n_b >= self.window:
+            self.last_price = None
+            self._returns.clear()
+            self._volatility = None
+            prices = prices[-self.window:]
+        for price in prices.tolist():
+            self._push_price(price)
+
+    @property
+    def variance(self):
+        """Population variance of every price seen so far."""
+        if self.count == 0:
+            return 0.0
+        return self._m2 / self.count
+
+    @property
+    def volatility(self):
+        """Standard deviation of the returns in the current window.
+
+        Two-pass over the (small) window, computed at most once per tick,
+        so it neither drifts over long runs nor cancels for tiny returns.
+        """
+        if self._volatility is None:
+            self._volatility = (float(np.std(self._returns))
+                                if self._returns else 0.0)
+        return self._volatility
 
 
 class Market:
     """Centralized market with supply/demand-driven pricing and transaction costs."""
 
-    def __init__(self, asset_configs, transaction_cost=0.02):
+    def __init__(self, asset_configs, transaction_cost=0.02, volatility_window=20,
+                 history_dtype=np.float64, history_maxlen=None,
+                 keep_resting_orders=False, rng=None):
         """
         asset_configs: list of dicts, e.g.
         [{"name": "Gold", "initial_price": 10.0}, ...]
         transaction_cost: fraction charged per trade (0.02 = 2%)
+        volatility_window: number of recent prices used by get_volatility
+        history_dtype: storage type of price histories (float64 or float32)
+        history_maxlen: keep only the last N prices per asset (None = all)
+        keep_resting_orders: carry unmatched orders over to the next step
+                             instead of expiring them when the book clears
+        rng: numpy Generator used for price noise (freshly seeded if
+             omitted)
         """
         self.assets = {}
-        self.order_book = {}
+        self.stats = {}
+        self.volatility_window = volatility_window
+        self.keep_resting_orders = keep_resting_orders
+        if rng is None:
+            rng = np.random.default_rng()
+        self.rng = rng
         self.transaction_cost = transaction_cost
         self.total_fees_collected = 0.0
 
         # Price movement sensitivity to order imbalance
         self.price_sensitivity = 0.03
 
-        # Track OHLC data per asset for candlestick charts
-        self.ohlc = {}
+        # Candles are aggregated lazily from the price/volume ticks
+        self.candles = {}
+
+        # Assets are also addressed by index for the columnar order book
+        self.asset_names = [cfg["name"] for cfg in asset_configs]
+        self.asset_index = {name: i for i, name in enumerate(self.asset_names)}
+        self.prices = np.array([cfg["initial_price"] for cfg in asset_configs],
+                               dtype=np.float64)
+
+        # Price pipeline: stages adjust the pending prices during a step and
+        # commit_tick() turns them into exactly one history tick per asset
+        self._pending = self.prices.copy()
+        self._pending_volume = np.zeros(len(self.asset_names))
+
+        self.order_book = OrderBook(len(self.asset_names))
+        # Rows before this index were resting when the current step began
+        self._step_start_row = 0
+        self.last_trades = OrderBook.no_trades()
 
         for cfg in asset_configs:
             name = cfg["name"]
             price = cfg["initial_price"]
             self.assets[name] = {
                 "price": price,
-                "historical_prices": [price],
+                "historical_prices": PriceHistory(
+                    price, dtype=history_dtype, maxlen=history_maxlen),
+                # Traded volume per price tick, aligned with historical_prices
+                "historical_volumes": PriceHistory(
+                    0.0, dtype=history_dtype, maxlen=history_maxlen),
                 "demand": 0,
                 "supply": 0,
                 "volume": 0,
+                "matched_volume": 0,
+                "clearing_price": None,
             }
-            self.order_book[name] = {"bids": [], "asks": []}
-            self.ohlc[name] = []
-            self._start_candle(name, price)
-
-    def _start_candle(self, name, price):
-        """Begin a new OHLC candle."""
-        self.ohlc[name].append({
-            "open": price, "high": price, "low": price, "close": price, "volume": 0
-        })
-
-    def _update_candle(self, name, price, volume=0):
-        """Update the current candle with a new price tick."""
-        candle = self.ohlc[name][-1]
-        candle["high"] = max(candle["high"], price)
-        candle["low"] = min(candle["low"], price)
-        candle["close"] = price
-        candle["volume"] += volume
+            self.stats[name] = PriceStats(price, volatility_window)
+            self.candles[name] = OHLCAggregator(
+                self.assets[name]["historical_prices"],
+                self.assets[name]["historical_volumes"])
+
+    def load_ticks(self, asset_name, prices, volumes):
+        """Append already-committed ticks in bulk (used to replay a journal)."""
+        asset = self.assets[asset_name]
+        asset["historical_prices"].extend(prices)
+        asset["historical_volumes"].extend(volumes)
+        self.stats[asset_name].extend(prices)
+        if len(prices):
+            asset["price"] = float(prices[-1])
+            self.prices[self.asset_index[asset_name]] = asset["price"]
+            self._pending[self.asset_index[asset_name]] = asset["price"]
 
     def get_price(self, asset_name):
         return self.assets[asset_name]["price"]
 
     def get_mean_price(self, asset_name):
-        hist = self.assets[asset_name]["historical_prices"]
-        return sum(hist) / len(hist)
+        return self.stats[asset_name].mean
+
+    def get_price_variance(self, asset_name):
+        return self.stats[asset_name].variance
 
     def get_price_history(self, asset_name):
-        return list(self.assets[asset_name]["historical_prices"])
+        """Read-only, zero-copy ndarray view of the retained price history."""
+        return self.assets[asset_name]["historical_prices"].view()
 
-    def get_ohlc(self, asset_name):
-        return list(self.ohlc[asset_name])
+    def get_ohlc(self, asset_name, period=5):
+        """OHLCV candles of `period` ticks as a dict of arrays.
+
+        Keys: tick, open, high, low, close, volume. Any period can be
+        requested at any time; results are cached per period.
+        """
+        return self.candles[asset_name].candles(period)
 
     def get_asset_trend(self, asset_name):
-        hist = self.assets[asset_name]["historical_prices"]
-        if len(hist) >= 2:
-            if hist[-1] > hist[-2]:
-                return "up"
-            elif hist[-1] < hist[-2]:
-                return "down"
-        return "stable"
+        return self.stats[asset_name].trend
 
     def get_asset_names(self):
-        return list(self.assets.keys())
+        return list(self.asset_names)
+
+    def price_vector(self):
+        """Current prices as an array ordered like get_asset_names()."""
+        return self.prices
 
-    def get_volatility(self, asset_name, window=20):
+    def get_volatility(self, asset_name, window=None):
         """Standard deviation of recent price changes."""
+        if window is None or window == self.volatility_window:
+            return self.stats[asset_name].volatility
+
+        # Non-default window: fall back to scanning the tail of the history
         hist = self.assets[asset_name]["historical_prices"]
         if len(hist) < 2:
             return 0.0
@@ -97,57 +240,124 @@ class Market:
         return fee
 
     def submit_order(self, agent_id, asset_name, order_type, price, quantity=1):
-        """Submit a bid or ask order. order_type: 'bid' or 'ask'."""
-        order = {"agent_id": agent_id, "price": price, "quantity": quantity}
-        if order_type == "bid":
-            self.order_book[asset_name]["bids"].append(order)
-        else:
-            self.order_book[asset_name]["asks"].append(order)
-
-    def clear_orders(self, asset_name):
-        """Supply/demand-driven price discovery."""
-        bids = self.order_book[asset_name]["bids"]
-        asks = self.order_book[asset_name]["asks"]
-        current_price = self.assets[asset_name]["price"]
-        n_bids = len(bids)
-        n_asks = len(asks)
+        """Submit a bid or ask limit order. order_type: 'bid' or 'ask'.
+
+        Returns the order id, which can be passed to cancel_order.
+        """
+        side = BID if order_type == "bid" else ASK
+        return self.order_book.add(
+            agent_id, self.asset_index[asset_name], side, price, quantity)
+
+    def submit_orders(self, agent_ids, asset_idx, sides, prices, quantities):
+        """Bulk intake of orders given as arrays (sides use BID/ASK)."""
+        return self.order_book.add_many(agent_ids, asset_idx, sides, prices, quantities)
+
+    def cancel_order(self, asset_name, order_id):
+        """Cancel a resting order. Returns False if it already filled or expired."""
+        return self.order_book.cancel(order_id)
+
+    def get_last_trades(self, asset_name):
+        """Trades matched by the most recent clear_orders call."""
+        trades = self.last_trades
+        rows = np.flatnonzero(trades["asset"] == self.asset_index[asset_name])
+        return [Trade(int(trades["buyer"][i]), int(trades["seller"][i]),
+                      float(trades["price"][i]), float(trades["quantity"][i]))
+                for i in rows]
+
+    def clear_orders(self):
+        """Match the book, then apply supply/demand-driven price discovery.
+
+        All assets clear together: the book is crossed in one vectorised
+        pass (price-time priority, volume-weighted clearing price per
+        asset), then the order imbalance of this step moves every price
+        at once.
+        """
+        book = self.order_book
+        n_assets = len(self.asset_names)
+        n_bids, n_asks = book.submitted_since(self._step_start_row)
         total_orders = n_bids + n_asks
 
-        if total_orders > 0:
-            # Order imbalance drives price: more bids = price up, more asks = price down
-            imbalance = (n_bids - n_asks) / total_orders  # range [-1, 1]
+        trades = book.match()
+        self.last_trades = trades
+        matched = np.bincount(trades["asset"], weights=trades["quantity"],
+                              minlength=n_assets)
+        notional = np.bincount(trades["asset"],
+                               weights=trades["price"] * trades["quantity"],
+                               minlength=n_assets)
+
+        # One uniform draw per asset, scaled to the noise or drift band below
+        u = self.rng.uniform(-1.0, 1.0, n_assets)
+        current = self._pending
+        has_orders = total_orders > 0
+
+        # Order imbalance drives price: more bids = price up, more asks = price down
+        imbalance = np.divide(n_bids - n_asks, total_orders,
+                              out=np.zeros(n_assets), where=has_orders)
+        traded_change = current * self.price_sensitivity * (imbalance + 0.005 * u)
+
+        # No orders — small random walk to prevent flat lines
+        drift = current * 0.002 * u
 
-            # Add noise for realism
-            noise = random.uniform(-0.005, 0.005)
+        self._pending = np.maximum(
+            0.01, current + np.where(has_orders, traded_change, drift))
+        self._pending_volume += total_orders
 
-            # Price change proportional to imbalance
-            price_change = current_price * self.price_sensitivity * (imbalance + noise)
-            new_price = max(0.01, current_price + price_change)
+        for i, name in enumerate(self.asset_names):
+            asset = self.assets[name]
+            asset["matched_volume"] = float(matched[i])
+            asset["clearing_price"] = (float(notional[i] / matched[i])
+                                       if matched[i] > 0 else None)
+            asset["demand"] = float(n_bids[i])
+            asset["supply"] = float(n_asks[i])
+            if total_orders[i] > 0:
+                asset["volume"] = float(total_orders[i])
 
-            self.assets[asset_name]["price"] = new_price
-            self.assets[asset_name]["historical_prices"].append(new_price)
-            self.assets[asset_name]["volume"] = total_orders
-            self._update_candle(asset_name, new_price, total_orders)
+        if self.keep_resting_orders:
+            book.compact()
         else:
-            # No orders — small random walk to prevent flat lines
-            drift = current_price * random.uniform(-0.002, 0.002)
-            new_price = max(0.01, current_price + drift)
-            self.assets[asset_name]["price"] = new_price
-            self.assets[asset_name]["historical_prices"].append(new_price)
-            self._update_candle(asset_name, new_price, 0)
-
-        self.assets[asset_name]["demand"] = n_bids
-        self.assets[asset_name]["supply"] = n_asks
-        self.order_book[asset_name] = {"bids": [], "asks": []}
-
-    def close_candle(self, asset_name):
-        """Close current candle and start a new one (call every N steps)."""
-        current_price = self.assets[asset_name]["price"]
-        self._start_candle(asset_name, current_price)
+            book.clear()
+        self._step_start_row = len(book)
+
+    # ---- Staged price pipeline ----
+
+    def _targets(self, asset_name):
+        return slice(None) if asset_name is None else self.asset_index[asset_name]
+
+    def get_pending_price(self, asset_name):
+        """Price the asset will be committed at if no further stage runs."""
+        return float(self._pending[self.asset_index[asset_name]])
+
+    def stage_shift(self, asset_name, delta):
+        """Add delta to the pending price (asset_name None = every asset)."""
+        idx = self._targets(asset_name)
+        self._pending[idx] = np.maximum(0.01, self._pending[idx] + delta)
+
+    def stage_scale(self, asset_name, factor):
+        """Multiply the pending price by factor (asset_name None = every asset)."""
+        idx = self._targets(asset_name)
+        self._pending[idx] = np.maximum(0.01, self._pending[idx] * factor)
 
     def update_price(self, asset_name, new_price):
-        """Direct price update (for events)."""
-        new_price = max(0.01, new_price)
-        self.assets[asset_name]["price"] = new_price
-        self.assets[asset_name]["historical_prices"].append(new_price)
-        self._update_candle(asset_name, new_price)
+        """Direct price update: overrides the pending price for this step."""
+        self._pending[self.asset_index[asset_name]] = max(0.01, new_price)
+
+    def commit_tick(self):
+        """Commit the pending prices as this step's single tick per asset.
+
+        Returns the committed (prices, volumes) arrays.
+        """
+        volumes = self._pending_volume.copy()
+        for i, name in enumerate(self.asset_names):
+            self._record_price(name, float(self._pending[i]), float(volumes[i]))
+        self._pending = self.prices.copy()
+        self._pending_volume[:] = 0.0
+        return self.prices.copy(), volumes
+
+    def _record_price(self, asset_name, new_price, volume=0.0):
+        """Set the current price, append the tick to history and update stats."""
+        asset = self.assets[asset_name]
+        asset["price"] = new_price
+        self.prices[self.asset_index[asset_name]] = new_price
+        asset["historical_prices"].append(new_price)
+        asset["historical_volumes"].append(volume)
+        self.stats[asset_name].add(new_price)
@@ -1,10 +1,13 @@
-import random
+import numpy as np
+
+from RandomStreams import UniformBlock
 
 
 class MarketEvent:
     """A market-wide event that affects asset prices over a duration."""
 
-    def __init__(self, name, event_type, magnitude, duration, target_assets=None):
+    def __init__(self, name, event_type, magnitude, duration, target_assets=None,
+                 rng=None):
         """
         name: display name ("Market Crash", "Bull Run")
         event_type: "crash", "boom", or "volatility_spike"
@@ -13,6 +16,8 @@ class MarketEvent:
                    for volatility_spike this is the max per-step shock fraction
         duration: number of steps the event lasts
         target_assets: list of asset names, or None for all
+        rng: UniformBlock for the volatility shocks (the model's "events"
+             stream; a freshly seeded one if omitted)
         """
         self.name = name
         self.event_type = event_type
@@ -21,6 +26,7 @@ class MarketEvent:
         self.target_assets = target_assets
         self.remaining_steps = 0
         self.active = False
+        self.rng = rng if rng is not None else UniformBlock(np.random.default_rng())
 
     def activate(self):
         self.active = True
@@ -34,20 +40,20 @@ class MarketEvent:
 
         targets = self.target_assets or market.get_asset_names()
 
+        # Events stage a multiplicative adjustment; the market commits the
+        # step's combined price once all stages have run
         for asset_name in targets:
-            current = market.get_price(asset_name)
-
             if self.event_type == "crash":
                 step_factor = 1 - ((1 - self.magnitude) / self.duration)
-                market.update_price(asset_name, current * step_factor)
+                market.stage_scale(asset_name, step_factor)
 
             elif self.event_type == "boom":
                 step_factor = 1 + ((self.magnitude - 1) / self.duration)
-                market.update_price(asset_name, current * step_factor)
+                market.stage_scale(asset_name, step_factor)
 
             elif self.event_type == "volatility_spike":
-                shock = random.uniform(-self.magnitude, self.magnitude)
-                market.update_price(asset_name, current * (1 + shock))
+                shock = self.rng.uniform(-self.magnitude, self.magnitude)
+                market.stage_scale(asset_name, 1 + shock)
 
         self.remaining_steps -= 1
         if self.remaining_steps <= 0:
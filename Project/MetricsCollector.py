@@ -0,0 +1,309 @@
+import numpy as np
+import pandas as pd
+
+
+# Per-agent series, in the column order of model.agent_state()
+AGENT_SERIES = ["Wealth", "Trades", "Interactions"]
+
+# Collector attribute name -> (model series, agent series) it exposes
+VIEWS = {
+    "datacollector_gini": (["Gini"], ["Wealth"]),
+    "datacollector_wealthiest_agent": (["Wealthiest Agent"], []),
+    "datacollector_currents": (["Wealthy Agents", "Non Wealthy Agents"], []),
+    "datacollector_total_wealth": (["Total Wealth"], ["Wealth"]),
+    "datacollector_trades": (["Total Trades"], ["Trades"]),
+    "datacollector_interactions": (["Total Interactions"], ["Interactions"]),
+    "datacollector_agent_wealth": ([], ["Wealth"]),
+}
+
+# Quantiles kept for agent series collected as "summary"
+SUMMARY_QUANTILES = [0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0]
+
+# Named collection configurations (see parse_collection_config)
+COLLECTION_PRESETS = {
+    "Full": "",
+    "Light": "agents=every:100+sample:100",
+    "Summary": "agents=summary",
+}
+
+
+def gini(wealth):
+    """Gini coefficient of a wealth array."""
+    x = np.sort(wealth)
+    n = len(x)
+    total = x.sum()
+    if n == 0 or total == 0:
+        return 0
+    b = (x * (n - np.arange(n))).sum() / (n * total)
+    return float(1 + (1 / n) - 2 * b)
+
+
+def summary_names(series):
+    """Model series names of an agent series' summary quantiles."""
+    return [f"{series} p{round(q * 100)}" for q in SUMMARY_QUANTILES]
+
+
+class CollectionPolicy:
+    """When and how much of one series to keep.
+
+    every:     keep every k-th step only
+    on_change: keep a value only when it differs from the last one kept
+               (per agent, for agent series)
+    sample:    agent series only - keep a fixed reservoir sample of this
+               many agents
+    summary:   agent series only - keep SUMMARY_QUANTILES of the agent
+               values as model series ("Wealth p50", ...) instead of the
+               per-agent vectors
+    """
+
+    def __init__(self, every=1, on_change=False, sample=None, summary=False):
+        if every < 1 or (sample is not None and sample < 1):
+            raise ValueError("every and sample must be at least 1")
+        self.every = every
+        self.on_change = on_change
+        self.sample = sample
+        self.summary = summary
+
+    def due(self, step):
+        return step % self.every == 0
+
+
+def parse_collection_config(config):
+    """Parse 'Gini=every:10,agents=every:100+sample:50' into policies.
+
+    Keys are series names or the groups "model" and "agents"; options are
+    joined with '+'. A preset name from COLLECTION_PRESETS, a dict of
+    ready-made policies or None are accepted as well.
+    """
+    if config is None:
+        return {}
+    if isinstance(config, dict):
+        return dict(config)
+    config = COLLECTION_PRESETS.get(config, config)
+    policies = {}
+    for item in config.split(","):
+        if not item.strip():
+            continue
+        key, _, options = item.partition("=")
+        kwargs = {}
+        for option in options.split("+"):
+            name, _, value = option.strip().partition(":")
+            if name in ("every", "sample"):
+                kwargs[name] = int(value)
+            elif name in ("on_change", "summary"):
+                kwargs[name] = True
+            else:
+                raise ValueError(f"Unknown collection option {option!r} in {item!r}")
+        policies[key.strip()] = CollectionPolicy(**kwargs)
+    return policies
+
+
+class MetricsCollector:
+    """All of a model's reporters, computed together once per step.
+
+    collect() reads agent state in one go through model.agent_state(),
+    which returns (ids, wealth, trades, interactions) arrays. Wealth
+    statistics come from the model's own reporters (FinancialModel's
+    WealthIndex, VectorizedModel's arrays); the rest from those arrays,
+    the market and the model's strategy counts.
+
+    What is kept follows a CollectionPolicy per series (see
+    parse_collection_config). Kept values are stored with their step;
+    per-agent series as (step, agent ids, values) arrays, once however
+    many views expose them. With a Recorder attached the kept values are
+    also streamed to disk.
+
+    views() returns lightweight stand-ins for the former per-metric Mesa
+    DataCollectors: each has model_vars (what Mesa's chart modules read)
+    and the DataCollector dataframe getters.
+    """
+
+    def __init__(self, asset_names, strategy_names, agent_series=True, recorder=None,
+                 policies=None, rng=None):
+        self.asset_names = list(asset_names)
+        self.strategy_names = list(strategy_names)
+        self.agent_series = agent_series
+        self.recorder = recorder
+        self.policies = parse_collection_config(policies)
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        self.price_names = [name + " Price" for name in self.asset_names]
+        self.volatility_names = [name + " Volatility" for name in self.asset_names]
+        names = [n for model_names, _ in VIEWS.values() for n in model_names]
+        names += self.price_names + self.volatility_names + self.strategy_names
+        for series in AGENT_SERIES:
+            if self.policy(series).summary:
+                names += summary_names(series)
+        self.model_vars = {name: [] for name in names}
+        self.model_steps = {name: [] for name in names}
+        self.agent_records = {name: {"steps": [], "ids": [], "values": []}
+                              for name in AGENT_SERIES}
+        self._last_agent_values = {}
+        self._samples = {}
+
+    def policy(self, name):
+        """Policy for a series: its own, else its group's, else keep everything."""
+        group = "agents" if name in AGENT_SERIES else "model"
+        return self.policies.get(name) or self.policies.get(group) or CollectionPolicy()
+
+    def views(self):
+        """Named views, one per former DataCollector attribute."""
+        views = {name: MetricsView(self, model_names, agent_names)
+                 for name, (model_names, agent_names) in VIEWS.items()}
+        views["datacollector_market_prices"] = MetricsView(self, self.price_names, [])
+        views["datacollector_strategies"] = MetricsView(self, self.strategy_names, [])
+        return views
+
+    # ---- Collection ----
+
+    def collect(self, model, step):
+        ids, wealth, trades, interactions = model.agent_state()
+        values = {
+            "Gini": float(model.compute_gini()),
+            "Wealthiest Agent": float(model.get_wealthiest_agent()),
+            "Wealthy Agents": model.current_wealthy_agents(),
+            "Non Wealthy Agents": model.current_non_wealthy_agents(),
+            "Total Wealth": float(model.compute_total_wealth()),
+            "Total Trades": int(trades.sum()),
+            "Total Interactions": int(interactions.sum()),
+        }
+        for asset_name, name in zip(self.asset_names, self.price_names):
+            values[name] = model.market.get_price(asset_name)
+        for asset_name, name in zip(self.asset_names, self.volatility_names):
+            values[name] = model.market.get_volatility(asset_name)
+        for name in self.strategy_names:
+            values[name] = model.count_strategy(name)
+
+        for series, array in zip(AGENT_SERIES, (wealth, trades, interactions)):
+            policy = self.policy(series)
+            if not policy.due(step):
+                continue
+            if policy.summary:
+                if len(array):
+                    values.update(zip(summary_names(series),
+                                      np.quantile(array, SUMMARY_QUANTILES).tolist()))
+            elif self.agent_series or self.recorder is not None:
+                self._collect_agents(series, policy, step, ids, array)
+
+        kept = [name for name, value in values.items()
+                if self._collect_model(name, step, value)]
+        if self.recorder is not None and kept:
+            # The recorder's model table has a fixed set of float columns;
+            # series not kept at this step are written as NaN
+            kept = set(kept)
+            self.recorder.record(step, {name: float(values[name]) if name in kept
+                                        else np.nan for name in self.model_vars})
+
+    def _collect_model(self, name, step, value):
+        policy = self.policy(name)
+        if not policy.due(step):
+            return False
+        kept = self.model_vars[name]
+        if policy.on_change and kept and kept[-1] == value:
+            return False
+        kept.append(value)
+        self.model_steps[name].append(step)
+        return True
+
+    def _collect_agents(self, series, policy, step, ids, values):
+        if policy.sample is not None:
+            keep = np.isin(ids, self._reservoir(series, ids, policy.sample))
+            ids, values = ids[keep], values[keep]
+        if policy.on_change:
+            last = self._by_id(self._last_agent_values, series, ids, np.nan)
+            changed = last[ids] != values
+            ids, values = ids[changed], values[changed]
+            last[ids] = values
+        ids, values = np.array(ids, copy=True), np.array(values, copy=True)
+
+        if self.agent_series:
+            records = self.agent_records[series]
+            records["steps"].append(step)
+            records["ids"].append(ids)
+            records["values"].append(values)
+        if self.recorder is not None:
+            self.recorder.record_agents(series, step, ids, values)
+
+    @staticmethod
+    def _by_id(arrays, series, ids, fill):
+        """Per-agent array for `series`, grown to cover every id in `ids`."""
+        array = arrays.get(series)
+        size = int(ids.max()) + 1 if len(ids) else 0
+        if array is None or len(array) < size:
+            grown = np.full(size, fill, dtype=type(fill))
+            if array is not None:
+                grown[:len(array)] = array
+            arrays[series] = array = grown
+        return array
+
+    def _reservoir(self, series, ids, size):
+        """Reservoir sample (Algorithm R) of agent ids, extended as agents appear."""
+        seen = self._by_id(self._samples, (series, "seen"), ids, False)
+        sample = self._samples.get(series, np.empty(0, dtype=np.int64))
+        new = ids[~seen[ids]]
+        if len(new):
+            seen[new] = True
+            fill = min(size - len(sample), len(new))
+            sample = np.concatenate([sample, new[:fill]])
+            rest = new[fill:]
+            # The k-th id seen replaces a random slot with probability size/k;
+            # when several pick the same slot the latest one wins
+            counts = np.count_nonzero(seen) - len(rest) + np.arange(1, len(rest) + 1)
+            slots = (self.rng.random(len(rest)) * counts).astype(np.int64)
+            hit = slots < size
+            last_slots, first = np.unique(slots[hit][::-1], return_index=True)
+            sample[last_slots] = rest[hit][::-1][first]
+            self._samples[series] = sample
+        return sample
+
+    # ---- Access ----
+
+    def agent_arrays(self):
+        """Every stored per-agent array (never modified once collected)."""
+        for records in self.agent_records.values():
+            yield from records["ids"]
+            yield from records["values"]
+
+    def get_model_vars_dataframe(self, names=None):
+        """Model series indexed by Step; steps a series did not keep are NaN."""
+        names = list(self.model_vars) if names is None else names
+        frame = pd.DataFrame({name: pd.Series(self.model_vars[name],
+                                              index=self.model_steps[name])
+                              for name in names})
+        return frame.rename_axis("Step")
+
+    def get_agent_vars_dataframe(self, names=AGENT_SERIES):
+        """Per-agent series indexed by (Step, AgentID), like Mesa's DataCollector."""
+        frames = []
+        for name in names:
+            records = self.agent_records[name]
+            if not records["steps"]:
+                continue
+            lengths = [len(ids) for ids in records["ids"]]
+            index = pd.MultiIndex.from_arrays(
+                [np.repeat(records["steps"], lengths), np.concatenate(records["ids"])],
+                names=["Step", "AgentID"])
+            frames.append(pd.DataFrame({name: np.concatenate(records["values"])},
+                                       index=index))
+        if not frames:
+            return pd.DataFrame(columns=list(names))
+        return pd.concat(frames, axis=1).sort_index()
+
+
+class MetricsView:
+    """A MetricsCollector seen as one of the former Mesa DataCollectors."""
+
+    def __init__(self, collector, model_names, agent_names):
+        self._collector = collector
+        self._model_names = model_names
+        self._agent_names = agent_names
+
+    @property
+    def model_vars(self):
+        return {name: self._collector.model_vars[name] for name in self._model_names}
+
+    def get_model_vars_dataframe(self):
+        return self._collector.get_model_vars_dataframe(self._model_names)
+
+    def get_agent_vars_dataframe(self):
+        return self._collector.get_agent_vars_dataframe(self._agent_names)
@@ -0,0 +1,106 @@
+import numpy as np
+
+from ArrayGrid import neighbourhood_offsets
+
+
+def prefer_dense(cells, agents):
+    """Whether a world of `cells` cells holding about `agents` agents should
+    use the dense index: yes unless it is much larger than the population."""
+    return cells <= max(16 * agents, 1 << 20)
+
+
+class NeighbourWealthIndex:
+    """Wealthiest agent around every cell, within a torus Moore radius.
+
+    build() takes a snapshot of agent positions and wealth; query() then
+    returns, for any cell, the wealthiest agent in the surrounding
+    (2r+1) x (2r+1) window with the cell itself excluded.
+
+    dense: rank agents by wealth and precompute, for every cell, the top
+           rank in its window as a sliding max over per-cell maxima, so
+           a query is a single array lookup.
+    sparse: keep only the occupied cells' maxima and look up the window
+            cells on demand; memory scales with agents, not area.
+    """
+
+    def __init__(self, width, height, radius=2, dense=True):
+        self.width = width
+        self.height = height
+        self.dense = dense
+        self._offsets = np.array(neighbourhood_offsets(width, height, radius),
+                                 dtype=np.int64).reshape(-1, 2)
+        self._wealth = None
+        self._ids = None
+        self._cells = None
+        self._ranks = None
+        self._rank_wealth = None
+        self._rank_ids = None
+
+    def build(self, xs, ys, wealth, ids):
+        """Snapshot agents given as equal-length arrays."""
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        wealth = np.asarray(wealth, dtype=np.float64)
+        ids = np.asarray(ids, dtype=np.int64)
+
+        # Wealthiest agent of every occupied cell
+        cell = ys * self.width + xs
+        if not self.dense:
+            if len(cell) == 0:
+                self._cells, self._wealth, self._ids = cell, wealth, ids
+                return
+            order = np.argsort(cell, kind="stable")
+            sorted_cells = cell[order]
+            sorted_wealth = wealth[order]
+            new_cell = np.r_[True, sorted_cells[1:] != sorted_cells[:-1]]
+            starts = np.flatnonzero(new_cell)
+            group = np.cumsum(new_cell) - 1
+            best_wealth = np.maximum.reduceat(sorted_wealth, starts)
+            winners = sorted_wealth == best_wealth[group]
+            best_ids = np.empty(len(starts), dtype=np.int64)
+            best_ids[group[winners]] = ids[order][winners]
+            self._cells, self._wealth, self._ids = sorted_cells[starts], best_wealth, best_ids
+            return
+
+        # Dense: rank agents by wealth so cell and window maxima are plain
+        # integer maxima; the rank then maps back to the agent
+        order = np.argsort(wealth, kind="stable")
+        self._rank_wealth = np.append(wealth[order], -np.inf)
+        self._rank_ids = np.append(ids[order], -1)
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        cell_rank = np.full(self.width * self.height, -1, dtype=np.int64)
+        np.maximum.at(cell_rank, cell, rank)
+        cell_rank = cell_rank.reshape(self.height, self.width)
+
+        # Sliding-window max over a torus-padded copy:
+        # result[y, x] = max over cell[(y + dy) % height, (x + dx) % width]
+        r = int(np.abs(self._offsets).max()) if len(self._offsets) else 0
+        padded = np.pad(cell_rank, r, mode="wrap")
+        best = np.full_like(cell_rank, -1)
+        h, w = cell_rank.shape
+        for dx, dy in self._offsets.tolist():
+            np.maximum(best, padded[r + dy:r + dy + h, r + dx:r + dx + w], out=best)
+        self._ranks = best
+
+    def query(self, xs, ys):
+        """(wealth, id) of the wealthiest neighbour of each cell; id -1 if none."""
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        if self.dense:
+            rank = self._ranks[ys, xs]
+            return self._rank_wealth[rank], self._rank_ids[rank]
+
+        nx = (xs[..., None] + self._offsets[:, 0]) % self.width
+        ny = (ys[..., None] + self._offsets[:, 1]) % self.height
+        window = ny * self.width + nx
+        if len(self._cells) == 0 or len(self._offsets) == 0:
+            return np.full(xs.shape, -np.inf), np.full(xs.shape, -1, dtype=np.int64)
+        idx = np.minimum(np.searchsorted(self._cells, window), len(self._cells) - 1)
+        found = self._cells[idx] == window
+        wealth = np.where(found, self._wealth[idx], -np.inf)
+        pick = wealth.argmax(axis=-1)[..., None]
+        best_wealth = np.take_along_axis(wealth, pick, axis=-1)[..., 0]
+        best_ids = np.where(np.isfinite(best_wealth),
+                            np.take_along_axis(self._ids[idx], pick, axis=-1)[..., 0], -1)
+        return best_wealth, best_ids
@@ -0,0 +1,109 @@
+import numpy as np
+
+from PriceHistory import PriceHistory
+
+
+_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+class OHLCAggregator:
+    """On-demand OHLCV candles for one asset, built from raw tick arrays.
+
+    Nothing is done per tick: candles are aggregated with NumPy
+    reduceat when asked for, at any period. Completed candles are cached
+    per period and only the ticks since the last request are aggregated
+    on the next call, so switching between resolutions is cheap.
+
+    Candle k of period P spans ticks k*P .. (k+1)*P inclusive: it opens
+    on the previous candle's close, and its volume is the volume of ticks
+    k*P + 1 .. (k+1)*P. The final candle may be partial.
+
+    When the tick histories are ring buffers, only candles opening on a
+    retained tick are returned, and each period's cache is itself a ring
+    sized to the retained window, so memory stays bounded.
+    """
+
+    def __init__(self, prices, volumes):
+        """prices, volumes: PriceHistory instances appended in lockstep."""
+        self.prices = prices
+        self.volumes = volumes
+        self._cache = {}
+
+    def _entry(self, period, start):
+        entry = self._cache.get(period)
+        next_k = None if entry is None else entry["first"] + entry["open"].total_count
+        # (Re)build from the oldest retained tick if nothing is cached yet,
+        # or if a ring buffer evicted ticks we never aggregated
+        if entry is None or next_k * period < start:
+            first = -(-start // period)
+            entry = {"first": first}
+            # Bounded like the ticks: no more candles than fit the window
+            maxlen = (None if self.prices.maxlen is None
+                      else self.prices.maxlen // period + 1)
+            for field in _FIELDS:
+                entry[field] = PriceHistory(dtype=np.float64, maxlen=maxlen)
+            self._cache[period] = entry
+        return entry
+
+    def candles(self, period):
+        """Dict of arrays: tick (opening tick index), open, high, low, close, volume."""
+        if period < 1:
+            raise ValueError("period must be at least 1")
+
+        ticks = self.prices.view()
+        vols = self.volumes.view()
+        total = self.prices.total_count
+        start = total - len(ticks)  # global index of ticks[0]
+        last = total - 1
+
+        entry = self._entry(period, start)
+        k_from = entry["first"] + entry["open"].total_count
+        k_to = last // period  # candles before this one are complete
+
+        if k_to > k_from:
+            self._extend(entry, ticks, vols, start, period, k_from, k_to)
+
+        # Cached candles that open before the oldest retained tick are
+        # dropped: they can no longer be rebuilt from the history
+        k_first = entry["first"] + entry["open"].total_count - len(entry["open"])
+        skip = max(-(-start // period) - k_first, 0)
+        k_first += skip
+        result = {field: entry[field].view()[skip:] for field in _FIELDS}
+
+        # The current, still-open candle is never cached
+        open_idx = k_to * period - start
+        if open_idx >= 0:
+            window = ticks[open_idx:]
+            partial = {
+                "open": window[0],
+                "high": window.max(),
+                "low": window.min(),
+                "close": window[-1],
+                "volume": vols[open_idx + 1:].sum(),
+            }
+            result = {field: np.append(result[field], partial[field])
+                      for field in _FIELDS}
+            k_last = k_to + 1
+        else:
+            k_last = k_to
+
+        result["tick"] = np.arange(k_first, k_last) * period
+        return result
+
+    def _extend(self, entry, ticks, vols, start, period, k_from, k_to):
+        """Aggregate complete candles k_from .. k_to - 1 into the cache."""
+        lo = k_from * period - start
+        hi = k_to * period - start  # closing tick of the last new candle
+        offsets = np.arange(0, hi - lo, period)
+
+        body = ticks[lo:hi]
+        closes = ticks[lo + period:hi + 1:period]
+        new = {
+            "open": ticks[lo:hi:period],
+            "high": np.maximum(np.maximum.reduceat(body, offsets), closes),
+            "low": np.minimum(np.minimum.reduceat(body, offsets), closes),
+            "close": closes,
+            "volume": np.add.reduceat(vols[lo + 1:hi + 1], offsets),
+        }
+        for field in _FIELDS:
+            entry[field].extend(new[field])
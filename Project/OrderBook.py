@@ -0,0 +1,239 @@
+from collections import namedtuple
+
+import numpy as np
+
+
+Trade = namedtuple("Trade", ["buyer_id", "seller_id", "price", "quantity"])
+
+BID = 0
+ASK = 1
+
+
+class OrderBook:
+    """Columnar limit order book shared by every asset in the market.
+
+    Orders are appended to preallocated parallel arrays (asset index,
+    side, price, quantity, agent id), so intake is amortised O(1) with no
+    per-order Python objects. Order ids are increasing sequence numbers
+    and double as the time priority.
+
+    match() crosses every asset at once: bids are ranked by (asset,
+    -price, time) and asks by (asset, price, time), and the two sorted
+    quantity ladders are merged with cumulative sums. The fills are the
+    same as repeatedly crossing the best bid with the best ask: partial
+    fills are allowed and each fill executes at the price of the order
+    that arrived first.
+    """
+
+    _COLUMNS = ("asset", "side", "price", "quantity", "agent", "order_id")
+
+    def __init__(self, n_assets, capacity=1024):
+        self.n_assets = n_assets
+        self._n = 0
+        self._next_id = 0
+        self._alloc(max(capacity, 1))
+
+    def _alloc(self, capacity):
+        self.asset = np.empty(capacity, dtype=np.int32)
+        self.side = np.empty(capacity, dtype=np.int8)
+        self.price = np.empty(capacity, dtype=np.float64)
+        self.quantity = np.empty(capacity, dtype=np.float64)
+        self.agent = np.empty(capacity, dtype=np.int64)
+        self.order_id = np.empty(capacity, dtype=np.int64)
+
+    def _reserve(self, extra):
+        needed = self._n + extra
+        capacity = len(self.asset)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for col in self._COLUMNS:
+            old = getattr(self, col)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, col, new)
+
+    def __len__(self):
+        return self._n
+
+    # ---- Intake ----
+
+    def add(self, agent_id, asset_idx, side, price, quantity=1):
+        """Append one order (side: BID or ASK). Returns its order id."""
+        if self._n == len(self.asset):
+            self._reserve(1)
+        i = self._n
+        order_id = self._next_id
+        self.asset[i] = asset_idx
+        self.side[i] = side
+        self.price[i] = price
+        self.quantity[i] = quantity
+        self.agent[i] = agent_id
+        self.order_id[i] = order_id
+        self._n += 1
+        self._next_id += 1
+        return order_id
+
+    def add_many(self, agent_ids, asset_idx, sides, prices, quantities):
+        """Append a batch of orders given as equal-length arrays.
+
+        Returns the array of assigned order ids.
+        """
+        k = len(asset_idx)
+        self._reserve(k)
+        lo, hi = self._n, self._n + k
+        self.asset[lo:hi] = asset_idx
+        self.side[lo:hi] = sides
+        self.price[lo:hi] = prices
+        self.quantity[lo:hi] = quantities
+        self.agent[lo:hi] = agent_ids
+        ids = np.arange(self._next_id, self._next_id + k, dtype=np.int64)
+        self.order_id[lo:hi] = ids
+        self._n = hi
+        self._next_id += k
+        return ids
+
+    def cancel(self, order_id):
+        """Cancel a live order. Returns False if it already filled or expired."""
+        ids = self.order_id[:self._n]
+        row = np.searchsorted(ids, order_id)
+        if row >= self._n or ids[row] != order_id or self.quantity[row] <= 0:
+            return False
+        self.quantity[row] = 0
+        return True
+
+    # ---- Queries ----
+
+    def _live(self, asset_idx, side):
+        n = self._n
+        return ((self.asset[:n] == asset_idx) & (self.side[:n] == side)
+                & (self.quantity[:n] > 0))
+
+    def best_bid(self, asset_idx):
+        mask = self._live(asset_idx, BID)
+        return float(self.price[:self._n][mask].max()) if mask.any() else None
+
+    def best_ask(self, asset_idx):
+        mask = self._live(asset_idx, ASK)
+        return float(self.price[:self._n][mask].min()) if mask.any() else None
+
+    def depth(self, asset_idx):
+        """Total live (bid quantity, ask quantity) for one asset."""
+        qty = self.quantity[:self._n]
+        return (float(qty[self._live(asset_idx, BID)].sum()),
+                float(qty[self._live(asset_idx, ASK)].sum()))
+
+    def submitted_since(self, row):
+        """Per-asset (bid quantity, ask quantity) of rows from `row` on."""
+        n = self._n
+        asset = self.asset[row:n]
+        qty = self.quantity[row:n]
+        is_bid = self.side[row:n] == BID
+        bids = np.bincount(asset[is_bid], weights=qty[is_bid], minlength=self.n_assets)
+        asks = np.bincount(asset[~is_bid], weights=qty[~is_bid], minlength=self.n_assets)
+        return bids, asks
+
+    # ---- Matching ----
+
+    @staticmethod
+    def no_trades():
+        """An empty fill table in the format returned by match()."""
+        return {
+            "asset": np.empty(0, dtype=np.int32),
+            "buyer": np.empty(0, dtype=np.int64),
+            "seller": np.empty(0, dtype=np.int64),
+            "price": np.empty(0, dtype=np.float64),
+            "quantity": np.empty(0, dtype=np.float64),
+        }
+
+    def match(self):
+        """Cross all assets in one vectorised pass.
+
+        Returns a dict of equal-length arrays describing every fill
+        (asset, buyer, seller, price, quantity), grouped by asset in fill
+        order. Filled quantity is deducted from the book.
+        """
+        n = self._n
+        empty = self.no_trades()
+        if n == 0:
+            return empty
+
+        asset = self.asset[:n]
+        side = self.side[:n]
+        price = self.price[:n]
+        qty = self.quantity[:n]
+        live = qty > 0
+
+        bid_rows = np.flatnonzero(live & (side == BID))
+        ask_rows = np.flatnonzero(live & (side == ASK))
+        if len(bid_rows) == 0 or len(ask_rows) == 0:
+            return empty
+
+        # Price-time priority ladders (rows are already in arrival order)
+        bid_rows = bid_rows[np.lexsort((bid_rows, -price[bid_rows], asset[bid_rows]))]
+        ask_rows = ask_rows[np.lexsort((ask_rows, price[ask_rows], asset[ask_rows]))]
+
+        n_assets = self.n_assets
+        bid_tot = np.bincount(asset[bid_rows], weights=qty[bid_rows], minlength=n_assets)
+        ask_tot = np.bincount(asset[ask_rows], weights=qty[ask_rows], minlength=n_assets)
+        crossable = np.minimum(bid_tot, ask_tot)
+        base = np.concatenate(([0.0], np.cumsum(crossable)[:-1]))
+
+        # Cumulative quantity ladders within each asset, mapped into one
+        # global coordinate where asset a occupies [base[a], base[a] + crossable[a]]
+        bid_end = self._ladder(bid_rows, bid_tot, crossable, base)
+        ask_end = self._ladder(ask_rows, ask_tot, crossable, base)
+
+        cuts = np.union1d(bid_end, ask_end)
+        cuts = np.union1d(cuts, base)
+        lo = cuts[:-1]
+        hi = cuts[1:]
+        seg_bid = bid_rows[np.searchsorted(bid_end, lo, side="right")]
+        seg_ask = ask_rows[np.searchsorted(ask_end, lo, side="right")]
+
+        # Stop each asset at the first segment where the book no longer crosses
+        seg_asset = asset[seg_bid]
+        fails = (price[seg_bid] < price[seg_ask]).astype(np.int64)
+        fails_so_far = np.cumsum(fails)
+        first = np.searchsorted(seg_asset, np.arange(n_assets))
+        offset = np.concatenate(([0], fails_so_far))[first]
+        keep = (fails_so_far - offset[seg_asset]) == 0
+
+        seg_bid, seg_ask = seg_bid[keep], seg_ask[keep]
+        fill_qty = (hi - lo)[keep]
+        fill_price = np.where(seg_bid < seg_ask, price[seg_bid], price[seg_ask])
+
+        np.subtract.at(self.quantity, seg_bid, fill_qty)
+        np.subtract.at(self.quantity, seg_ask, fill_qty)
+
+        return {
+            "asset": asset[seg_bid],
+            "buyer": self.agent[seg_bid],
+            "seller": self.agent[seg_ask],
+            "price": fill_price,
+            "quantity": fill_qty,
+        }
+
+    def _ladder(self, rows, totals, crossable, base):
+        """End of each order on its asset's quantity ladder, capped at the crossable size."""
+        a = self.asset[rows]
+        q = self.quantity[rows]
+        cum = np.cumsum(q)
+        start_of_asset = np.concatenate(([0.0], np.cumsum(totals)[:-1]))
+        within = cum - start_of_asset[a]
+        return base[a] + np.minimum(within, crossable[a])
+
+    def compact(self):
+        """Drop filled and cancelled orders, keeping arrival order."""
+        n = self._n
+        keep = np.flatnonzero(self.quantity[:n] > 0)
+        k = len(keep)
+        for col in self._COLUMNS:
+            arr = getattr(self, col)
+            arr[:k] = arr[keep]
+        self._n = k
+
+    def clear(self):
+        """Drop every order."""
+        self._n = 0
@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class Portfolio:
+    """Asset holdings of every agent as one agents x assets quantity matrix.
+
+    Row i holds the number of units of each asset owned by agent i, so an
+    agent's holdings take constant memory however much it trades. Buying
+    and selling are O(1) updates of two cells, and valuing every agent is
+    a single matrix-vector product with the market's price vector.
+    """
+
+    def __init__(self, n_agents, n_assets, initial_quantity=1, dtype=np.int64):
+        self.quantities = np.full((n_agents, n_assets), initial_quantity, dtype=dtype)
+        # Per-agent unit totals, kept in sync so random picks are O(n_assets)
+        self.units = self.quantities.sum(axis=1)
+
+    @property
+    def n_assets(self):
+        return self.quantities.shape[1]
+
+    def quantity(self, agent_idx, asset_idx):
+        return int(self.quantities[agent_idx, asset_idx])
+
+    def total_units(self, agent_idx):
+        return int(self.units[agent_idx])
+
+    def transfer(self, from_idx, to_idx, asset_idx, quantity=1):
+        """Move units of one asset between two agents."""
+        self.quantities[from_idx, asset_idx] -= quantity
+        self.quantities[to_idx, asset_idx] += quantity
+        self.units[from_idx] -= quantity
+        self.units[to_idx] += quantity
+
+    def transfer_many(self, from_idx, to_idx, asset_idx):
+        """Move one unit per (from, to, asset) triple, given as arrays."""
+        np.add.at(self.quantities, (from_idx, asset_idx), -1)
+        np.add.at(self.quantities, (to_idx, asset_idx), 1)
+        self.units -= np.bincount(from_idx, minlength=len(self.units))
+        self.units += np.bincount(to_idx, minlength=len(self.units))
+
+    def pick_unit(self, agent_idx, r):
+        """Asset index of the r-th unit held by an agent (0 <= r < total_units).
+
+        Drawing r uniformly picks an asset with probability proportional
+        to how many units of it the agent holds.
+        """
+        for asset_idx, qty in enumerate(self.quantities[agent_idx].tolist()):
+            if r < qty:
+                return asset_idx
+            r -= qty
+        raise IndexError("unit index out of range")
+
+    def value(self, agent_idx, prices):
+        """Market value of one agent's holdings."""
+        return float(self.quantities[agent_idx] @ prices)
+
+    def values(self, prices):
+        """Market value of every agent's holdings."""
+        return self.quantities @ prices
@@ -0,0 +1,136 @@
+import numpy as np
+
+
+class PriceHistory:
+    """Append-only price series backed by a typed NumPy buffer.
+
+    The buffer grows by doubling, so appends are amortised O(1) and each
+    price costs 8 bytes (4 with float32) instead of a boxed Python float.
+    view() hands out read-only slices of the buffer without copying.
+
+    With maxlen set the store becomes a bounded ring buffer that keeps
+    only the last maxlen prices. Every value is written twice (at i and
+    i + maxlen) so the retained window is always one contiguous slice.
+    In ring mode a view is only stable until the next append.
+
+    Deep copies share the buffer copy-on-write: the buffer is duplicated
+    only when one of the sharing copies appends, so forking a model with
+    a long history is cheap until the forks diverge.
+    """
+
+    def __init__(self, initial=None, dtype=np.float64, maxlen=None, capacity=64):
+        self.dtype = np.dtype(dtype)
+        self.maxlen = maxlen
+        self._count = 0
+        # Number of PriceHistory objects sharing _buf (shared list cell)
+        self._refs = [1]
+
+        if maxlen is not None:
+            if maxlen < 1:
+                raise ValueError("maxlen must be at least 1")
+            self._buf = np.empty(2 * maxlen, dtype=self.dtype)
+        else:
+            self._buf = np.empty(max(capacity, 1), dtype=self.dtype)
+
+        if initial is not None:
+            self.append(initial)
+
+    def _own(self):
+        """Take a private copy of the buffer before writing to a shared one."""
+        if self._refs[0] > 1:
+            self._refs[0] -= 1
+            self._buf = self._buf.copy()
+            self._refs = [1]
+
+    def append(self, value):
+        """Append a single price."""
+        if self._refs[0] > 1:
+            self._own()
+        if self.maxlen is not None:
+            slot = self._count % self.maxlen
+            self._buf[slot] = value
+            self._buf[slot + self.maxlen] = value
+        else:
+            if self._count == len(self._buf):
+                self._grow()
+            self._buf[self._count] = value
+        self._count += 1
+
+    def extend(self, values):
+        """Append an array of prices."""
+        values = np.asarray(values, dtype=self.dtype)
+        self._own()
+        if self.maxlen is not None:
+            # Values older than the last maxlen would be evicted immediately
+            skipped = max(len(values) - self.maxlen, 0)
+            self._count += skipped
+            for value in values[skipped:]:
+                self.append(value)
+            return
+        k = len(values)
+        while self._count + k > len(self._buf):
+            self._grow()
+        self._buf[self._count:self._count + k] = values
+        self._count += k
+
+    def _grow(self):
+        new_buf = np.empty(len(self._buf) * 2, dtype=self.dtype)
+        new_buf[:self._count] = self._buf[:self._count]
+        self._buf = new_buf
+
+    def __deepcopy__(self, memo):
+        clone = object.__new__(PriceHistory)
+        clone.__dict__.update(self.__dict__)
+        self._refs[0] += 1
+        memo[id(self)] = clone
+        return clone
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.maxlen is None:
+            # Only the filled part of the buffer is worth storing
+            state["_buf"] = self._buf[:self._count].copy()
+        state["_refs"] = [1]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.maxlen is None and len(self._buf) == 0:
+            self._buf = np.empty(1, dtype=self.dtype)
+
+    @property
+    def total_count(self):
+        """Number of prices ever appended (including evicted ones)."""
+        return self._count
+
+    def view(self):
+        """Read-only ndarray over the retained prices, oldest first."""
+        if self.maxlen is None or self._count <= self.maxlen:
+            v = self._buf[:min(self._count, len(self._buf))]
+        else:
+            start = self._count % self.maxlen
+            v = self._buf[start:start + self.maxlen]
+        v = v.view()
+        v.flags.writeable = False
+        return v
+
+    def to_list(self):
+        return self.view().tolist()
+
+    @property
+    def nbytes(self):
+        return self._buf.nbytes
+
+    def __len__(self):
+        if self.maxlen is None:
+            return self._count
+        return min(self._count, self.maxlen)
+
+    def __getitem__(self, index):
+        return self.view()[index]
+
+    def __iter__(self):
+        return iter(self.view())
+
+    def __repr__(self):
+        return f"PriceHistory(len={len(self)}, dtype={self.dtype}, maxlen={self.maxlen})"
@@ -0,0 +1,88 @@
+import numpy as np
+
+
+# A model's independent streams, in spawn order. Append new names at the
+# end: a stream's draws depend on its position in this list.
+STREAMS = ["agents", "grid", "market", "events", "strategies", "collector"]
+
+
+class UniformBlock:
+    """Scalar uniform draws served from pre-generated blocks.
+
+    One Generator.random(size) call fills a block, which is then handed
+    out one float at a time, so per-draw cost is about that of the
+    standard random module instead of a NumPy scalar call. Picklable, with
+    the position in the current block.
+    """
+
+    def __init__(self, rng, size=4096):
+        self.rng = rng
+        self.size = size
+        self._refill()
+
+    def _refill(self):
+        self._block = iter(self.rng.random(self.size).tolist())
+
+    def random(self):
+        """Uniform float in [0, 1)."""
+        for u in self._block:
+            return u
+        self._refill()
+        return next(self._block)
+
+    def uniform(self, low, high):
+        return low + (high - low) * self.random()
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+
+class RandomStreams:
+    """Independent random streams of one model, spawned from one seed.
+
+    A NumPy SeedSequence built from `seed` (fresh OS entropy when None)
+    spawns one Generator per name in STREAMS, so components draw from
+    streams that never overlap and do not depend on each other's draw
+    counts. `seed` gives back the root entropy, which reproduces every
+    stream even when no seed was passed.
+    """
+
+    def __init__(self, seed=None, block_size=4096):
+        if isinstance(seed, np.random.SeedSequence):
+            self.seed_sequence = seed
+        else:
+            self.seed_sequence = np.random.SeedSequence(seed)
+        self.block_size = block_size
+        children = self.seed_sequence.spawn(len(STREAMS))
+        self.generators = {name: np.random.default_rng(child)
+                           for name, child in zip(STREAMS, children)}
+        self._blocks = {}
+
+    @property
+    def seed(self):
+        return self.seed_sequence.entropy
+
+    def generator(self, name):
+        """NumPy Generator of stream `name`, for vectorised draws."""
+        return self.generators[name]
+
+    def random_seed(self, name):
+        """Integer seed drawn from stream `name` for a standard random.Random.
+
+        Seeding e.g. Mesa's model.random with it makes that generator's
+        draws part of the stream.
+        """
+        return int(self.generators[name].integers(2**63))
+
+    def uniforms(self, name):
+        """UniformBlock over stream `name`, for scalar draws."""
+        block = self._blocks.get(name)
+        if block is None:
+            block = self._blocks[name] = UniformBlock(self.generators[name],
+                                                      self.block_size)
+        return block
+
+    def spawn(self, n):
+        """n independent RandomStreams, e.g. for replications of a model."""
+        return [RandomStreams(child, self.block_size)
+                for child in self.seed_sequence.spawn(n)]
@@ -0,0 +1,246 @@
+import glob
+import os
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed to record or read recordings
+    pa = None
+
+
+RECORDER_FORMATS = ["parquet", "arrow"]
+_SUFFIXES = {"parquet": ".parquet", "arrow": ".arrow"}
+_PART_PATTERN = "*-[0-9][0-9][0-9][0-9][0-9]"
+
+
+def _part_files(directory):
+    """Recording part files in `directory` (any table, either format)."""
+    return sorted(path for suffix in _SUFFIXES.values()
+                  for path in glob.glob(os.path.join(directory, _PART_PATTERN + suffix)))
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError(
+            "Recording metrics needs pyarrow; install it with `pip install pyarrow`")
+
+
+class _TableSink:
+    """One table of a recording, buffered and written a row group at a time.
+
+    Each writer session produces a numbered part file (`Wealth-00000.parquet`,
+    ...); a part is complete and readable once its writer is closed.
+    """
+
+    def __init__(self, directory, name, fmt, row_group_size):
+        self.directory = directory
+        self.name = name
+        self.format = fmt
+        self.row_group_size = row_group_size
+        self.part = 0
+        self.part_rows = 0
+        self._columns = {}
+        self._rows = 0
+        self._writer = None
+        self._schema = None
+        # (part, rows) the files must be cut back to before a sink restored
+        # from a checkpoint may write; None for a live sink
+        self._resume_at = None
+
+    def _part_path(self, part):
+        return os.path.join(self.directory,
+                            f"{self.name}-{part:05d}{_SUFFIXES[self.format]}")
+
+    def append(self, columns):
+        """Buffer equal-length column arrays (copied), writing full row groups."""
+        for name, values in columns.items():
+            self._columns.setdefault(name, []).append(np.array(values, copy=True))
+        self._rows += len(next(iter(columns.values())))
+        if self._rows >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        if self._resume_at is not None:
+            raise ValueError(f"Recorder {self.directory} was restored from a "
+                             "checkpoint and is read-only until resume() is called")
+        table = pa.table({name: np.concatenate(chunks)
+                          for name, chunks in self._columns.items()})
+        if self._writer is None:
+            self._schema = table.schema
+            path = self._part_path(self.part)
+            if self.format == "parquet":
+                self._writer = pq.ParquetWriter(path, self._schema)
+            else:
+                self._writer = ipc.new_file(path, self._schema)
+        table = table.cast(self._schema)
+        if self.format == "parquet":
+            self._writer.write_table(table, row_group_size=len(table))
+        else:
+            self._writer.write_table(table, max_chunksize=len(table))
+        self.part_rows += len(table)
+        self._columns = {}
+        self._rows = 0
+
+    def close(self):
+        """Flush and finish the current part; the next write starts a new one."""
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self.part += 1
+            self.part_rows = 0
+
+    def __getstate__(self):
+        """The open writer stays with this sink; a restored copy starts a new part."""
+        state = self.__dict__.copy()
+        state["_writer"] = None
+        if self._writer is not None:
+            state["_resume_at"] = (self.part, self.part_rows)
+            state["part"] = self.part + 1
+            state["part_rows"] = 0
+        elif self._resume_at is None:
+            state["_resume_at"] = (self.part, 0)
+        return state
+
+    def resume(self):
+        """Cut this table's files back to where the checkpoint left them."""
+        if self._resume_at is None:
+            return
+        part, rows = self._resume_at
+        if rows:
+            self._truncate_part(part, rows)
+            part += 1
+        suffix = _SUFFIXES[self.format]
+        for path in glob.glob(os.path.join(self.directory, f"{self.name}-*{suffix}")):
+            number = os.path.basename(path)[len(self.name) + 1:-len(suffix)]
+            if number.isdigit() and len(number) == 5 and int(number) >= part:
+                os.remove(path)
+        self._resume_at = None
+
+    def _truncate_part(self, part, rows):
+        path = self._part_path(part)
+        try:
+            if self.format == "parquet":
+                table = pq.read_table(path)
+            else:
+                table = ipc.open_file(pa.memory_map(path)).read_all()
+        except (OSError, pa.ArrowInvalid) as exc:
+            raise ValueError(f"{path} is missing or unfinished; close the recorder "
+                             "that wrote it before resuming") from exc
+        table = table.slice(0, rows)
+        tmp = path + ".tmp"
+        if self.format == "parquet":
+            pq.write_table(table, tmp, row_group_size=self.row_group_size)
+        else:
+            with ipc.new_file(tmp, table.schema) as writer:
+                writer.write_table(table, max_chunksize=self.row_group_size)
+        os.replace(tmp, path)
+
+
+class Recorder:
+    """Streams model and per-agent series to disk while the model runs.
+
+    Writes tables into the directory `path`, as Parquet or Arrow IPC
+    files: `model` (one row per collected step, float columns, NaN where
+    a series was not kept) and one table per agent series, e.g. `Wealth`
+    (columns Step, AgentID, Wealth; one row per kept agent value). Rows
+    are buffered in memory until `row_group_size` of them are waiting and
+    then written as one row group, so memory use stays bounded however
+    long the run. Read results back with read_recording().
+
+    A directory that already holds a recording is refused unless
+    `overwrite` is set, which deletes its part files (nothing else).
+    Pickling (e.g. in a checkpoint) leaves the files alone; a restored
+    recorder writes only after resume().
+
+    Needs the optional pyarrow package.
+    """
+
+    def __init__(self, path, format="parquet", row_group_size=65536, overwrite=False):
+        _require_pyarrow()
+        if format not in RECORDER_FORMATS:
+            raise ValueError(
+                f"Unknown recorder format {format!r} (expected one of {RECORDER_FORMATS})")
+        self.path = path
+        self.format = format
+        os.makedirs(path, exist_ok=True)
+        self.row_group_size = row_group_size
+        self._model = _TableSink(path, "model", format, row_group_size)
+        self._agents = {}
+        stale = _part_files(path)
+        if stale and not overwrite:
+            raise FileExistsError(f"{path} already holds a recording; "
+                                  "pass overwrite=True to replace it")
+        for part in stale:
+            os.remove(part)
+
+    def _sinks(self):
+        return [self._model, *self._agents.values()]
+
+    def record(self, step, values):
+        """Buffer one row of model-level `values` (name -> number)."""
+        row = {"Step": [step]}
+        row.update((name, [value]) for name, value in values.items())
+        self._model.append(row)
+
+    def record_agents(self, series, step, ids, values):
+        """Buffer one step of a per-agent series."""
+        sink = self._agents.get(series)
+        if sink is None:
+            sink = self._agents[series] = _TableSink(
+                self.path, series, self.format, self.row_group_size)
+        sink.append({
+            "Step": np.full(len(ids), step, dtype=np.int64),
+            "AgentID": ids,
+            series: values,
+        })
+
+    def flush(self):
+        for sink in self._sinks():
+            sink.flush()
+
+    def close(self):
+        for sink in self._sinks():
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def resume(self):
+        """Continue a recorder restored from a checkpoint.
+
+        Rows and parts written after the checkpoint was taken belong to a
+        run that is being replaced and are removed, so call this only when
+        the restored model takes over the recording. A part that was open
+        at the checkpoint must have been finished (its recorder closed).
+        """
+        for sink in self._sinks():
+            sink.resume()
+
+
+def read_recording(path):
+    """Return (model, agents) memory-mapped from a recording.
+
+    model is a pyarrow Table and agents a dict of one Table per agent
+    series. Only parts whose writer was closed (Recorder.close() or the
+    model's close_recorder()) are complete and can be read.
+    """
+    _require_pyarrow()
+    parts = {}
+    for part in _part_files(path):
+        name = os.path.basename(part).rsplit("-", 1)[0]
+        if part.endswith(_SUFFIXES["parquet"]):
+            table = pq.read_table(part, memory_map=True)
+        else:
+            table = ipc.open_file(pa.memory_map(part)).read_all()
+        parts.setdefault(name, []).append(table)
+    tables = {name: pa.concat_tables(tables) for name, tables in parts.items()}
+    return tables.pop("model", pa.table({})), tables
@@ -0,0 +1,132 @@
+import functools
+import glob
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+
+# Model parameters whose runs write files: a cache hit would skip writing them
+SIDE_EFFECT_PARAMS = ("journal_path", "recorder_path")
+
+_MISSING = object()
+
+
+def _has_side_effects(params):
+    if isinstance(params, dict):
+        return any((name in SIDE_EFFECT_PARAMS and value is not None)
+                   or _has_side_effects(value) for name, value in params.items())
+    if isinstance(params, (list, tuple)):
+        return any(_has_side_effects(value) for value in params)
+    return False
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """Hash of the simulation's source files; any code change gives a new one."""
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for path in sorted(glob.glob(os.path.join(directory, "*.py"))):
+        digest.update(os.path.basename(path).encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class RunCache:
+    """Content-addressed on-disk cache of simulation results.
+
+    An entry is keyed by the SHA-256 of its parameters, seed and
+    code_version(), and holds whatever the run produced (collected series,
+    final agent tables, ...) as a pickle named after the key. Reads mark
+    an entry as recently used; once the directory grows past `max_bytes`
+    the least recently used entries are evicted. Entries are written to a
+    temporary file and renamed into place, so several processes (e.g. the
+    workers of a sweep) can share one cache.
+
+    Only seeded runs are cached: without a seed a run is not repeatable.
+    Runs that write files (SIDE_EFFECT_PARAMS such as a journal or
+    recorder path) are not cached either, since a hit would skip writing
+    them.
+    """
+
+    SUFFIX = ".pkl"
+
+    def __init__(self, directory=".run_cache", max_bytes=512 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, params, seed):
+        """Hex key of a run of `params` (a JSON-able dict) with `seed`.
+
+        Raises TypeError for values JSON cannot represent, whose key would
+        not be stable across processes.
+        """
+        try:
+            payload = json.dumps({"params": params, "seed": seed, "code": code_version()},
+                                 sort_keys=True)
+        except TypeError as exc:
+            raise TypeError(f"Run cache keys need JSON-able parameters: {exc}") from None
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return default
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            pass
+        return value
+
+    def put(self, key, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+        self._evict()
+
+    def get_or_run(self, params, seed, run):
+        """Cached result of run() for (params, seed), running it on a miss."""
+        if seed is None or _has_side_effects(params):
+            return run()
+        key = self.key(params, seed)
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = run()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.directory, "*" + self.SUFFIX)):
+            os.remove(path)
+
+    def _evict(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, "*" + self.SUFFIX)):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        # Oldest use first
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
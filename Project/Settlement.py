@@ -0,0 +1,138 @@
+import logging
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from EventLog import TRADE
+from OrderBook import BID, ASK
+from TradeJournal import BUY, SELL, TRANSFER, FEE
+
+
+class TradeIntent(NamedTuple):
+    """One trade an agent has decided to make, not yet applied.
+
+    kind is BUY (agent buys one unit of `asset` from other), SELL (agent
+    sells one unit to other) or TRANSFER (agent gives other `price` units
+    of wealth); `fee` is what agent pays the market on top of `price`.
+    """
+    kind: int
+    agent: object
+    other: object
+    asset: Optional[str]
+    price: float
+    fee: float
+
+
+def _within_limits(keys, amounts, limits):
+    """Whether each claim fits its key's limit, claims taken in the given order.
+
+    Claims on one key (an agent's cash, an agent's units of one asset)
+    are accepted while their running total stays within the key's limit.
+    Amounts are never negative, so once a claim overdraws, every later
+    claim on that key is refused too.
+    """
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    sorted_amounts = amounts[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    totals = np.cumsum(sorted_amounts)
+    before = totals[starts] - sorted_amounts[starts]
+    totals -= np.repeat(before, np.diff(np.r_[starts, len(keys)]))
+    accepted = np.empty(len(keys), dtype=bool)
+    accepted[order] = totals <= limits[order] + 1e-9
+    return accepted
+
+
+def settle(model, intents):
+    """Resolve and apply one step's intents in bulk; returns the accepted mask.
+
+    Intents are taken in the order they were decided. Every claim is
+    checked against the snapshot the agents decided on: a payer's cash
+    outlays (price plus fee) must fit the wealth it started the step
+    with, and a seller's units of an asset must fit its holding. Claims
+    that would double-spend cash or sell a unit twice are refused
+    (income received in the same settlement does not count). The
+    accepted trades then move units, cash and fees in a few array
+    operations and reach the order book and journal as batches.
+    """
+    if not intents:
+        return np.zeros(0, dtype=bool)
+    market = model.market
+    portfolio = model.portfolio
+    n_agents = len(portfolio.units)
+
+    kinds, initiators, others, assets, prices, fees = zip(*intents)
+    kind = np.array(kinds, dtype=np.int64)
+    agent = np.array([a.unique_id for a in initiators], dtype=np.int64)
+    other = np.array([a.unique_id for a in others], dtype=np.int64)
+    asset = np.array([-1 if name is None else market.asset_index[name]
+                      for name in assets], dtype=np.int64)
+    price = np.array(prices, dtype=np.float64)
+    fee = np.array(fees, dtype=np.float64)
+
+    by_id = {a.unique_id: a for a in initiators}
+    by_id.update((a.unique_id, a) for a in others)
+    wealth = np.zeros(n_agents)
+    wealth[list(by_id)] = [a.wealth for a in by_id.values()]
+
+    # Cash flows from payer to payee; units from seller to buyer
+    sell = kind == SELL
+    payer = np.where(sell, other, agent)
+    payee = np.where(sell, agent, other)
+    seller = np.where(sell, agent, other)
+    buyer = np.where(sell, other, agent)
+    trade = kind != TRANSFER
+
+    accepted = _within_limits(payer, price + fee, wealth[payer])
+    units = np.where(trade, 1, 0)
+    holding = portfolio.quantities[seller, np.maximum(asset, 0)]
+    accepted &= _within_limits(np.where(trade, seller * portfolio.n_assets + asset, -1),
+                               units, np.where(trade, holding, 0))
+
+    kind, agent, other, asset, price, fee = (
+        kind[accepted], agent[accepted], other[accepted],
+        asset[accepted], price[accepted], fee[accepted])
+    payer, payee, seller, buyer, trade = (
+        payer[accepted], payee[accepted], seller[accepted],
+        buyer[accepted], trade[accepted])
+
+    # Cash and fees
+    delta = (np.bincount(payee, price, n_agents)
+             - np.bincount(payer, price + fee, n_agents))
+    changed = np.flatnonzero(delta)
+    for uid, change in zip(changed.tolist(), delta[changed].tolist()):
+        a = by_id[uid]
+        a.wealth = a.wealth + change
+    charged = fee > 0
+    for uid, paid in zip(agent[charged].tolist(), fee[charged].tolist()):
+        by_id[uid].fees_paid += paid
+    market.total_fees_collected += float(fee.sum())
+    for uid, count in zip(*np.unique(agent, return_counts=True)):
+        by_id[int(uid)].trades_completed += int(count)
+
+    # Units, and the orders the trades leave in the book: a bid from the
+    # buying initiator, an ask from the selling one
+    portfolio.transfer_many(seller[trade], buyer[trade], asset[trade])
+    side = kind[trade]
+    market.submit_orders(agent[trade], asset[trade], np.where(side == BUY, BID, ASK),
+                         price[trade], np.ones(len(side)))
+
+    journal = model.journal
+    if journal is not None:
+        step = model.schedule.time
+        journal.record_many(step, agent, other, asset, kind, price,
+                            trade.astype(np.float64))
+        journal.record_many(step, agent[charged], -1, -1, FEE,
+                            price[charged], 0, fee[charged])
+
+    if TRADE.isEnabledFor(logging.INFO):
+        names = market.asset_names
+        for k, a, o, i, p in zip(kind.tolist(), agent.tolist(), other.tolist(),
+                                 asset.tolist(), price.tolist()):
+            if k == TRANSFER:
+                TRADE.info("Agent %d traded %d units of wealth with Agent %d.",
+                           a, p, o)
+            else:
+                TRADE.info("Agent %d traded %s with Agent %d for %s units of wealth.",
+                           a, names[i], o, p)
+    return accepted
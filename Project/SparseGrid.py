@@ -0,0 +1,69 @@
+from ArrayGrid import neighbourhood_offsets
+
+
+class SparseGrid:
+    """Torus grid that only stores occupied cells.
+
+    Agents are kept in a dict from (x, y) to the list of agents in that
+    cell; a cell's entry is dropped as soon as it empties. Memory scales
+    with the number of agents rather than width * height, which suits
+    very large, thinly populated worlds. Implements the MultiGrid methods
+    the models use, with neighbourhoods in MultiGrid's order.
+    """
+
+    def __init__(self, width, height, torus=True):
+        if not torus:
+            raise ValueError("SparseGrid only supports torus grids")
+        self.width = width
+        self.height = height
+        self.torus = True
+        self._cells = {}
+        self._offsets = {}
+
+    @property
+    def occupied_cells(self):
+        return len(self._cells)
+
+    def _neighbourhood(self, radius, moore, include_center):
+        key = (radius, moore, include_center)
+        if key not in self._offsets:
+            self._offsets[key] = neighbourhood_offsets(self.width, self.height, *key)
+        return self._offsets[key]
+
+    def get_neighborhood(self, pos, moore=True, include_center=False, radius=1):
+        x, y = pos
+        w, h = self.width, self.height
+        return [((x + dx) % w, (y + dy) % h)
+                for dx, dy in self._neighbourhood(radius, moore, include_center)]
+
+    def place_agent(self, agent, pos):
+        self._cells.setdefault(pos, []).append(agent)
+        agent.pos = pos
+
+    def remove_agent(self, agent):
+        cell = self._cells[agent.pos]
+        cell.remove(agent)
+        if not cell:
+            del self._cells[agent.pos]
+        agent.pos = None
+
+    def move_agent(self, agent, pos):
+        self.remove_agent(agent)
+        self.place_agent(agent, pos)
+
+    def is_cell_empty(self, pos):
+        return pos not in self._cells
+
+    def get_cell_list_contents(self, cell_list):
+        if isinstance(cell_list, tuple) and len(cell_list) == 2 \
+                and not isinstance(cell_list[0], tuple):
+            cell_list = [cell_list]
+        cells = self._cells
+        return [agent for pos in cell_list if pos in cells for agent in cells[pos]]
+
+    def iter_cell_list_contents(self, cell_list):
+        return iter(self.get_cell_list_contents(cell_list))
+
+    def get_neighbors(self, pos, moore=True, include_center=False, radius=1):
+        return self.get_cell_list_contents(
+            self.get_neighborhood(pos, moore, include_center, radius))
@@ -0,0 +1,138 @@
+import functools
+import itertools
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+from FinancialModel import FinancialModel
+from RunCache import RunCache
+from VectorizedModel import VectorizedModel
+
+
+ENGINES = {"agents": FinancialModel, "vectorized": VectorizedModel}
+
+
+def expand_parameters(parameters):
+    """Every combination of a parameter dict, like mesa.batch_run.
+
+    Values that are lists, tuples or ranges are swept; anything else
+    (including strings) is held fixed.
+    """
+    names = list(parameters)
+    choices = [list(v) if isinstance(v, (list, tuple, range)) else [v]
+               for v in parameters.values()]
+    return [dict(zip(names, combo)) for combo in itertools.product(*choices)]
+
+
+def sweep_tasks(parameters, iterations=1, max_steps=100, seed=None,
+                engine="agents", cache=None):
+    """One task per (parameter combination, replication).
+
+    With a base `seed`, run i is seeded with seed + i, so a sweep is
+    reproducible whatever order its runs finish in.
+    """
+    tasks = []
+    for params in expand_parameters(parameters):
+        for iteration in range(iterations):
+            run_id = len(tasks)
+            tasks.append((run_id, iteration, params, max_steps,
+                          None if seed is None else seed + run_id, engine, cache))
+    return tasks
+
+
+def final_metrics(engine, params, max_steps, seed):
+    """Run one model and return the last kept value of each collected series."""
+    model = ENGINES[engine](**params, seed=seed)
+    for _ in range(max_steps):
+        model.step()
+
+    row = {"Step": max_steps, "Fees Collected": model.market.total_fees_collected}
+    for name, values in model.metrics.model_vars.items():
+        row[name] = values[-1] if values else np.nan
+    return row
+
+
+def run_one(task):
+    """Run a single sweep task and return its result row."""
+    run_id, iteration, params, max_steps, seed, engine, cache = task
+    run = functools.partial(final_metrics, engine, params, max_steps, seed)
+    if cache is not None:
+        metrics = cache.get_or_run(
+            {"sweep": engine, "params": params, "max_steps": max_steps}, seed, run)
+    else:
+        metrics = run()
+    return {"RunId": run_id, "iteration": iteration, "seed": seed, **params, **metrics}
+
+
+def default_chunksize(n_tasks, processes):
+    """Same heuristic as Pool.map: about four chunks per worker."""
+    chunksize, extra = divmod(n_tasks, processes * 4)
+    return chunksize + 1 if extra else max(chunksize, 1)
+
+
+def run_sweep(parameters, iterations=1, max_steps=100, processes=None,
+              chunksize=None, seed=None, engine="agents", cache=None):
+    """Run a parameter sweep over a process pool, yielding rows as runs finish.
+
+    parameters: dict of model keyword arguments; list/tuple/range values
+                are swept (see expand_parameters)
+    iterations: replications of each parameter combination
+    processes:  pool size (default: all cores); 1 runs in this process
+    chunksize:  tasks handed to a worker at a time (default: about four
+                chunks per worker, as Pool.map does)
+    seed:       base seed; run i uses seed + i
+    engine:     "agents" (FinancialModel) or "vectorized" (VectorizedModel)
+    cache:      optional RunCache; seeded runs already in it are not rerun
+
+    Runs are independent and only a small row of final values travels
+    back per run, so the sweep scales with the number of cores. Rows
+    arrive in completion order (see their "RunId"), nothing is collected
+    in the parent: pass the generator to write_sweep() or consume it as
+    it goes.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r} (expected one of {list(ENGINES)})")
+    tasks = sweep_tasks(parameters, iterations, max_steps, seed, engine, cache)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        yield from map(run_one, tasks)
+        return
+    if chunksize is None:
+        chunksize = default_chunksize(len(tasks), processes)
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap_unordered(run_one, tasks, chunksize)
+
+
+def write_sweep(path, rows):
+    """Write sweep rows to a JSON Lines file as they arrive; returns the count.
+
+    One object per line, flushed per run, so a partial file is readable
+    while the sweep is still going (pandas.read_json(path, lines=True)).
+    Rows may have different columns, e.g. when asset_config is swept.
+    """
+    count = 0
+    with open(path, "w") as f:
+        for row in rows:
+            f.write(json.dumps(row, default=lambda value: value.item()) + "\n")
+            f.flush()
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    params = {
+        "number_of_agents": [20, 50, 100],
+        "width": 20,
+        "height": 20,
+        "strategy_mode": ["Equal Distribution", "Random Mix"],
+        "initial_wealth": 10,
+        "asset_config": "Gold:10,Silver:5",
+        "event_mode": ["None", "Market Crash"],
+        "transaction_cost": [0.0, 0.02, 0.05],
+    }
+    n = write_sweep("sweep_results.jsonl",
+                    run_sweep(params, iterations=3, max_steps=100, seed=0,
+                              cache=RunCache("sweep_cache")))
+    print(f"Wrote {n} runs to sweep_results.jsonl")
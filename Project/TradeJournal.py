@@ -0,0 +1,250 @@
+import json
+import struct
+
+import numpy as np
+
+from Market import Market
+
+
+# Record kinds (stored in the `side` field)
+BUY = 0        # agent bought qty of asset from counterparty at price
+SELL = 1       # agent sold qty of asset to counterparty at price
+TRANSFER = 2   # agent gave `price` units of wealth to counterparty
+FEE = 3        # agent paid `fee` on a trade worth `price`
+TICK = 4       # committed market price of asset for the step; qty = volume
+DEPOSIT = 5    # agent's opening cash balance (`price`)
+HOLDING = 6    # agent's opening holding of asset (`qty`)
+
+RECORD_DTYPE = np.dtype([
+    ("step", "<u4"),
+    ("agent", "<i4"),
+    ("counterparty", "<i4"),
+    ("asset", "<i2"),
+    ("side", "u1"),
+    ("price", "<f8"),
+    ("qty", "<f8"),
+    ("fee", "<f8"),
+])  # packed: 39 bytes per record
+
+MAGIC = b"FMJRNL"
+VERSION = 1
+_PREFIX = struct.Struct("<6sHI")  # magic, version, metadata length
+
+
+class TradeJournal:
+    """Append-only binary journal of fixed-width trade records.
+
+    Records are staged in a preallocated NumPy block and written to disk a
+    whole block at a time. The file starts with a small JSON header that
+    names the assets, so it can be read back without the model.
+    """
+
+    def __init__(self, path, asset_configs, transaction_cost=0.0, block_size=65536):
+        self.path = path
+        self.asset_configs = list(asset_configs)
+        self.transaction_cost = transaction_cost
+        self.block_size = block_size
+        self._block = np.zeros(block_size, dtype=RECORD_DTYPE)
+        self._n = 0
+        self.records_written = 0
+
+        meta = json.dumps({"assets": self.asset_configs,
+                           "transaction_cost": transaction_cost}).encode("utf-8")
+        self._file = open(path, "wb")
+        self._file.write(_PREFIX.pack(MAGIC, VERSION, len(meta)))
+        self._file.write(meta)
+
+    def record(self, step, agent, counterparty, asset, side, price, qty=1.0, fee=0.0):
+        """Stage one record, writing the block out when it fills up."""
+        self._block[self._n] = (step, agent, counterparty, asset, side, price, qty, fee)
+        self._n += 1
+        if self._n == self.block_size:
+            self._write_block()
+
+    def record_many(self, step, agent, counterparty, asset, side, price, qty, fee=0.0):
+        """Stage a batch of records given as arrays (or broadcastable scalars)."""
+        k = np.broadcast(step, agent, counterparty, asset, side, price, qty, fee).size
+        batch = np.zeros(k, dtype=RECORD_DTYPE)
+        batch["step"] = step
+        batch["agent"] = agent
+        batch["counterparty"] = counterparty
+        batch["asset"] = asset
+        batch["side"] = side
+        batch["price"] = price
+        batch["qty"] = qty
+        batch["fee"] = fee
+        # Fill the block, writing it out each time it is full
+        done = 0
+        while done < k:
+            take = min(k - done, self.block_size - self._n)
+            self._block[self._n:self._n + take] = batch[done:done + take]
+            self._n += take
+            done += take
+            if self._n == self.block_size:
+                self._write_block()
+
+    def _write_block(self):
+        if self._file is None:
+            raise ValueError(f"Journal {self.path} was restored from a checkpoint "
+                             "and is read-only until resume() is called")
+        if self._n:
+            self._file.write(self._block[:self._n].tobytes())
+            self.records_written += self._n
+            self._n = 0
+
+    def flush(self):
+        """Write staged records and push them to the file."""
+        self._write_block()
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None and not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getstate__(self):
+        """Checkpoints keep the path, the write position and the staged records.
+
+        Nothing is written: the position counts records still staged in
+        memory, which travel with the checkpoint instead.
+        """
+        state = self.__dict__.copy()
+        state["_file"] = None
+        state["_block"] = self._block[:self._n].copy()
+        if self._file is not None:
+            state["_offset"] = self._file.tell()
+        return state
+
+    def __setstate__(self, state):
+        staged = state.pop("_block")
+        self.__dict__.update(state)
+        self._block = np.zeros(self.block_size, dtype=RECORD_DTYPE)
+        self._block[:len(staged)] = staged
+
+    def resume(self):
+        """Reopen a journal restored from a checkpoint for writing.
+
+        Records written after the checkpoint was taken are truncated
+        away, so call this only when the restored model replaces the run
+        that wrote them. The file must hold everything written up to the
+        checkpoint (close or flush the original journal first).
+        """
+        if self._file is not None:
+            return
+        f = open(self.path, "r+b")
+        size = f.seek(0, 2)
+        if size < self._offset:
+            f.close()
+            raise ValueError(f"Journal {self.path} is shorter than at the checkpoint "
+                             f"({size} < {self._offset} bytes)")
+        f.truncate(self._offset)
+        f.seek(self._offset)
+        self._file = f
+
+
+def read_journal(path):
+    """Return (metadata, records) with records memory-mapped from disk."""
+    with open(path, "rb") as f:
+        magic, version, meta_len = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a trade journal")
+        if version != VERSION:
+            raise ValueError(
+                f"Unsupported journal version {version} (expected {VERSION})")
+        meta = json.loads(f.read(meta_len).decode("utf-8"))
+    offset = _PREFIX.size + meta_len
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=offset)
+    return meta, records
+
+
+class JournalReplay:
+    """Rebuild market prices, candles and agent balances from a journal.
+
+    Nothing is re-simulated: prices come from the TICK records and
+    balances/holdings from vectorised sums over the trade records.
+    """
+
+    def __init__(self, path, up_to_step=None):
+        self.meta, records = read_journal(path)
+        if up_to_step is not None:
+            records = records[records["step"] <= up_to_step]
+        self.records = records
+
+        asset_configs = self.meta["assets"]
+        self.market = Market(asset_configs,
+                             transaction_cost=self.meta["transaction_cost"],
+                             rng=np.random.default_rng(0))
+        ticks = records[records["side"] == TICK]
+        for i, cfg in enumerate(asset_configs):
+            mine = ticks[ticks["asset"] == i]
+            self.market.load_ticks(cfg["name"], mine["price"], mine["qty"])
+
+        self._rebuild_balances(len(asset_configs))
+
+    def _rebuild_balances(self, n_assets):
+        r = self.records
+        kind = r["side"]
+        agent = r["agent"].astype(np.int64)
+        cp = r["counterparty"].astype(np.int64)
+        asset = r["asset"].astype(np.int64)
+        price = r["price"]
+        qty = r["qty"]
+        n_agents = int(max(agent.max(), cp.max())) + 1 if len(r) else 0
+        n_cells = n_agents * n_assets
+
+        def per_agent(ids, weights):
+            return np.bincount(ids, weights=weights,
+                               minlength=n_agents).astype(np.float64, copy=False)
+
+        def per_holding(ids, assets, weights):
+            return np.bincount(ids * n_assets + assets, weights=weights,
+                               minlength=n_cells).astype(np.float64, copy=False)
+
+        m = kind == DEPOSIT
+        cash = per_agent(agent[m], price[m])
+        m = kind == HOLDING
+        holdings = per_holding(agent[m], asset[m], qty[m])
+
+        # BUY moves cash from agent to counterparty and units the other
+        # way; SELL is the mirror image
+        for side, sign in ((BUY, 1.0), (SELL, -1.0)):
+            m = kind == side
+            value = sign * price[m] * qty[m]
+            units = sign * qty[m]
+            cash -= per_agent(agent[m], value)
+            cash += per_agent(cp[m], value)
+            holdings += per_holding(agent[m], asset[m], units)
+            holdings -= per_holding(cp[m], asset[m], units)
+
+        m = kind == TRANSFER
+        cash -= per_agent(agent[m], price[m])
+        cash += per_agent(cp[m], price[m])
+
+        m = kind == FEE
+        fees = per_agent(agent[m], r["fee"][m])
+        cash -= fees
+
+        self.cash = cash
+        self.holdings = holdings.reshape(n_agents, n_assets)
+        self.fees_paid = fees
+
+    def get_price_history(self, asset_name):
+        return self.market.get_price_history(asset_name)
+
+    def get_ohlc(self, asset_name, period=5):
+        return self.market.get_ohlc(asset_name, period)
+
+    def net_worth(self):
+        """Cash plus holdings valued at the last replayed prices."""
+        return self.cash + self.holdings @ self.market.price_vector()
+
+    def trades(self):
+        """BUY and SELL records only."""
+        side = self.records["side"]
+        return self.records[(side == BUY) | (side == SELL)]
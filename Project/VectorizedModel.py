@@ -0,0 +1,477 @@
+import numpy as np
+from mesa import Model
+
+from ArrayGrid import ArrayGrid
+from EventLog import MODEL
+from FinancialModel import (PREDEFINED_EVENTS, STRATEGIES, create_event,
+                            parse_asset_config, strategy_fluctuation)
+from Market import Market
+from MetricsCollector import MetricsCollector, gini
+from NeighbourIndex import NeighbourWealthIndex, prefer_dense
+from OrderBook import BID, ASK
+from Portfolio import Portfolio
+from RandomStreams import RandomStreams
+from Recorder import Recorder
+
+
+# Strategy ids index STRATEGY_NAMES
+AT, WT, MR, MM, CC, RA, AD = range(len(STRATEGIES))
+
+TREND_CODES = {"up": 0, "down": 1, "stable": 2}
+
+# Parameters of the built-in strategies (see strategies.py)
+MEAN_REVERSION_THRESHOLD = 0.2
+COPY_COOLDOWN = 5
+RISK_WINDOW = 10
+LEARNING_RATE = 0.1
+DISCOUNT_FACTOR = 0.9
+EPSILON = 0.2
+# Adaptive states: 3 wealth states x 3 trends x 3 holding states
+N_STATES = 27
+BUY_ACTION, SELL_ACTION, HOLD_ACTION = range(3)
+
+
+class VectorizedModel(Model):
+    """Struct-of-arrays engine for the FinancialModel simulation.
+
+    Takes the same parameters as FinancialModel but keeps agent state in
+    NumPy arrays (position, wealth, holdings, strategy id and per-strategy
+    state) instead of Agent objects. A step runs as a few vectorised
+    kernels:
+
+    1. every agent moves to a random Moore neighbour cell (ArrayGrid),
+    2. a random activation order is drawn and each agent picks a random
+       distinct cellmate as it would find them at its turn,
+    3. the (agent, cellmate) interactions run in that order, batched into
+       rounds of pairwise-disjoint pairs, so each round is exactly what
+       sequential execution in that order would do,
+    4. the shared Market pipeline (fluctuations, clearing, events,
+       commit) runs as in FinancialModel.
+
+    Copycat agents compare neighbours by who was wealthiest in each cell
+    when trading began. Trade journals, activity logs and checkpoints are
+    only available on FinancialModel; metrics recording works on both.
+    """
+
+    def __init__(self, number_of_agents, width, height, strategy_mode,
+                 initial_wealth, asset_config="Gold:10,Silver:5",
+                 event_mode="None", recorder_path=None, recorder_format="parquet",
+                 collection=None, transaction_cost=0.02, seed=None,
+                 recorder_overwrite=False, price_history_maxlen=None,
+                 price_history_dtype="float64"):
+        super().__init__()
+        # Every draw comes from streams spawned from `seed` (RandomStreams.py);
+        # Mesa's self.random is seeded too but nothing here draws from it
+        self.streams = RandomStreams(seed)
+        self.random.seed(self.streams.seed)
+        self.width = width
+        self.height = height
+        self.strategy_mode = strategy_mode
+        self.initial_wealth = float(initial_wealth)
+        self.time = 0
+
+        self.num_agents = number_of_agents
+        if self.num_agents > width * height:
+            MODEL.warning("Number of agents is bigger than the number of cells. "
+                          "Reducing to %d.", width * height)
+            self.num_agents = width * height
+        n = self.num_agents
+
+        # Agent-level draws come from one NumPy stream
+        self.rng = self.streams.generator("agents")
+
+        asset_configs = parse_asset_config(asset_config)
+        self.market = Market(
+            asset_configs, transaction_cost, history_dtype=price_history_dtype,
+            history_maxlen=price_history_maxlen or None,
+            rng=self.streams.generator("market"))
+        self.portfolio = Portfolio(n, len(asset_configs))
+        self.recorder = None
+        if recorder_path is not None:
+            self.recorder = Recorder(recorder_path, recorder_format,
+                                     overwrite=recorder_overwrite)
+        self.collection = collection
+
+        # ---- Agent state ----
+        self.wealth = np.full(n, self.initial_wealth)
+        self.strategy = self._assign_strategies(n)
+        self.trades_completed = np.zeros(n, dtype=np.int64)
+        self.interactions = np.zeros(n, dtype=np.int64)
+        self.fees_paid = np.zeros(n)
+
+        # One agent per cell to start with, as in FinancialModel
+        self.grid = ArrayGrid(width, height, capacity=n)
+        cells = self.rng.choice(width * height, n, replace=False)
+        self.grid.place_many(cells % width, cells // width)
+
+        # Copycat: imitated strategy id (-1 = none yet) and cooldown. The
+        # neighbour index is dense unless the world is much larger than
+        # the population
+        self._neighbours = NeighbourWealthIndex(
+            width, height, radius=2, dense=prefer_dense(width * height, n))
+        self._neighbours_built_at = None
+        self.copied = np.full(n, -1, dtype=np.int8)
+        self.copy_cooldown = np.zeros(n, dtype=np.int32)
+
+        # Risk Averse: ring of the last RISK_WINDOW wealth observations
+        self.ra_history = np.zeros((n, RISK_WINDOW))
+        self.ra_history[:, 0] = self.initial_wealth
+        self.ra_count = np.ones(n, dtype=np.int64)
+        self.fear = np.zeros(n)
+
+        # Adaptive: Q-tables only for agents that can run the strategy
+        # directly or by imitation
+        learners = np.flatnonzero((self.strategy == AD) | (self.strategy == CC))
+        self.q_slot = np.full(n, -1, dtype=np.int64)
+        self.q_slot[learners] = np.arange(len(learners))
+        self.q_table = np.zeros((len(learners), N_STATES, 3))
+        self.last_state = np.full(n, -1, dtype=np.int16)
+        self.last_action = np.full(n, -1, dtype=np.int8)
+        self.last_wealth = self.wealth.copy()
+
+        self.events = []
+        if event_mode in PREDEFINED_EVENTS:
+            self.trigger_event(event_mode)
+
+        self._orders = []
+        self.initalize_data_collectors()
+
+    def _assign_strategies(self, n):
+        if self.strategy_mode in STRATEGIES:
+            return np.full(n, STRATEGIES.index(self.strategy_mode), dtype=np.int8)
+        if self.strategy_mode == "Random Mix":
+            return self.rng.integers(0, len(STRATEGIES), n).astype(np.int8)
+        if self.strategy_mode == "Equal Distribution":
+            return (np.arange(n) % len(STRATEGIES)).astype(np.int8)
+        return np.full(n, AT, dtype=np.int8)
+
+    def trigger_event(self, event_name):
+        """Activate one of PREDEFINED_EVENTS from the next step on."""
+        event = create_event(event_name, self.streams.uniforms("events"))
+        self.events.append(event)
+        return event
+
+    def step(self):
+        """Advance the model by one step."""
+        old_cell = self.grid.move_random(self.rng)
+        initiators, partners = self.grid.cellmate_pairs(
+            old_cell, self.rng.permutation(self.num_agents), self.rng)
+        self._trade(initiators, partners)
+        self._finish_step()
+
+    def _finish_step(self):
+        """Market pipeline and data collection, once the agents have traded."""
+        self.time += 1
+        self._apply_price_fluctuations()
+        self.market.clear_orders()
+        self.events = [e for e in self.events if e.tick(self.market)]
+        self.market.commit_tick()
+
+        self.collect_data()
+
+    def _apply_price_fluctuations(self):
+        if self.time % 10 != 0:
+            return
+        counts = self.strategy_counts()
+        fluctuation = strategy_fluctuation(counts[MR], counts[MM], self.num_agents)
+        if fluctuation != 0.0:
+            self.market.stage_shift(None, fluctuation)
+
+    def market_view(self):
+        """(prices, mean prices, trend codes) per asset, as strategies see them."""
+        names = self.market.asset_names
+        means = np.array([self.market.get_mean_price(nm) for nm in names])
+        trends = np.array([TREND_CODES[self.market.get_asset_trend(nm)]
+                           for nm in names], dtype=np.int64)
+        return self.market.price_vector().copy(), means, trends
+
+    def _trade(self, a, o):
+        """Run the step's interactions and send the resulting orders to the market."""
+        self._prices, self._means, self._trends = self.market_view()
+        self._run_rounds(a, o)
+        orders = self._take_orders()
+        if orders is not None:
+            self.market.submit_orders(*orders, np.ones(len(orders[0])))
+
+    def _run_rounds(self, a, o):
+        """Run interactions in order, one round of disjoint pairs at a time.
+
+        A pair joins a round once every earlier pair sharing one of its
+        agents has run, so each round's pairs are independent and the
+        result equals running all pairs one after another.
+        """
+        priority = np.arange(len(a))
+        claim = np.empty(self.num_agents, dtype=np.int64)
+        no_claim = len(a)
+        while len(a):
+            claim[a] = no_claim
+            claim[o] = no_claim
+            np.minimum.at(claim, a, priority)
+            np.minimum.at(claim, o, priority)
+            ready = (claim[a] == priority) & (claim[o] == priority)
+            self._interact(a[ready], o[ready])
+            a, o, priority = a[~ready], o[~ready], priority[~ready]
+
+    def _take_orders(self):
+        """(agents, assets, sides, prices) of the orders placed since the last
+        call, or None."""
+        if not self._orders:
+            return None
+        orders = tuple(np.concatenate(c) for c in zip(*self._orders))
+        self._orders = []
+        return orders
+
+    def _interact(self, a, o):
+        """One interaction per disjoint (agent, cellmate) pair."""
+        live = self.wealth[a] > 0
+        a, o = a[live], o[live]
+        self.interactions[a] += 1
+
+        sid = self.strategy[a]
+        copycats = sid == CC
+        if copycats.any():
+            sid = sid.copy()
+            sid[copycats] = self._copycat(a[copycats])
+
+        u = self.rng.random((len(a), 3))
+        kernels = ((AT, self._asset_trading), (WT, self._wealth_trading),
+                   (MR, self._mean_reversion), (MM, self._momentum),
+                   (RA, self._risk_averse), (AD, self._adaptive))
+        for strategy_id, kernel in kernels:
+            mask = sid == strategy_id
+            if mask.any():
+                kernel(a[mask], o[mask], u[mask])
+
+    # ---- Trade execution helpers ----
+
+    def _pick_units(self, agents, u):
+        """Asset index of a random held unit per agent (weighted by quantity)."""
+        units = self.portfolio.units[agents]
+        r = np.minimum((u * units).astype(np.int64), units - 1)
+        cum = self.portfolio.quantities[agents].cumsum(axis=1)
+        return (cum <= r[:, None]).sum(axis=1)
+
+    def _transfer_units(self, from_idx, to_idx, assets):
+        self.portfolio.quantities[from_idx, assets] -= 1
+        self.portfolio.quantities[to_idx, assets] += 1
+        self.portfolio.units[from_idx] -= 1
+        self.portfolio.units[to_idx] += 1
+
+    def _buy(self, a, o, assets):
+        """a buys one unit of each asset from o at market price."""
+        price = self._prices[assets]
+        self._transfer_units(o, a, assets)
+        self.wealth[o] += price
+        self.wealth[a] -= price
+        self.trades_completed[a] += 1
+        self._orders.append((a, assets, np.full(len(a), BID, dtype=np.int8), price))
+
+    def _sell(self, a, o, assets):
+        """a sells one unit of each asset to o at market price."""
+        price = self._prices[assets]
+        self._transfer_units(a, o, assets)
+        self.wealth[a] += price
+        self.wealth[o] -= price
+        self.trades_completed[a] += 1
+        self._orders.append((a, assets, np.full(len(a), ASK, dtype=np.int8), price))
+
+    # ---- Strategy kernels (mirror strategies.py) ----
+
+    def _asset_trading(self, a, o, u):
+        m = self.portfolio.units[o] > 0
+        a, o, u = a[m], o[m], u[m]
+        assets = self._pick_units(o, u[:, 0])
+        price = self._prices[assets]
+        fee = self.market.transaction_cost * price
+        ok = self.wealth[a] >= price + fee
+        a, o, assets, fee = a[ok], o[ok], assets[ok], fee[ok]
+        self._buy(a, o, assets)
+        self.wealth[a] -= fee
+        self.fees_paid[a] += fee
+        self.market.total_fees_collected += float(fee.sum())
+
+    def _wealth_trading(self, a, o, u):
+        m = (self.wealth[o] > 0) & (self.wealth[a] >= 1)
+        a, o, u = a[m], o[m], u[m]
+        amount = np.floor(u[:, 0] * np.floor(self.wealth[a])) + 1
+        self.wealth[a] -= amount
+        self.wealth[o] += amount
+        self.trades_completed[a] += 1
+
+    def _mean_reversion(self, a, o, u):
+        m = self.portfolio.units[o] > 0
+        a, o, u = a[m], o[m], u[m]
+        assets = self._pick_units(o, u[:, 0])
+        price = self._prices[assets]
+        ok = ((np.abs(price - self._means[assets]) > MEAN_REVERSION_THRESHOLD)
+              & (self.wealth[a] >= price))
+        self._buy(a[ok], o[ok], assets[ok])
+
+    def _momentum(self, a, o, u):
+        m = self.portfolio.units[o] > 0
+        a, o, u = a[m], o[m], u[m]
+        assets = self._pick_units(o, u[:, 0])
+        price = self._prices[assets]
+        trend = self._trends[assets]
+
+        buy = (trend == TREND_CODES["up"]) & (self.wealth[a] >= price)
+        sell = ((trend == TREND_CODES["down"]) & (self.wealth[o] >= price)
+                & (self.portfolio.units[a] > 0))
+        self._buy(a[buy], o[buy], assets[buy])
+        self._sell(a[sell], o[sell], self._pick_units(a[sell], u[sell, 1]))
+
+    def _update_fear(self, a):
+        w = self.wealth[a]
+        count = self.ra_count[a]
+        self.ra_history[a, count % RISK_WINDOW] = w
+        count += 1
+        self.ra_count[a] = count
+        oldest = self.ra_history[a, np.where(count <= RISK_WINDOW, 0, count % RISK_WINDOW)]
+
+        change = w - oldest
+        self.fear[a] = np.where(
+            change < 0,
+            np.minimum(1.0, np.abs(change) / max(self.initial_wealth, 1)),
+            np.maximum(0.0, self.fear[a] - 0.1))
+
+    def _risk_averse(self, a, o, u):
+        self._update_fear(a)
+        m = (u[:, 0] >= self.fear[a]) & (self.portfolio.units[o] > 0)
+        a, o, u = a[m], o[m], u[m]
+
+        assets = self._pick_units(o, u[:, 1])
+        price = self._prices[assets]
+        mean = self._means[assets]
+        buy = (price <= mean) & (self.wealth[a] >= price)
+        self._buy(a[buy], o[buy], assets[buy])
+
+        sell = ~buy & (price > mean * 1.2) & (self.portfolio.units[a] > 0)
+        a, o, u = a[sell], o[sell], u[sell]
+        assets = self._pick_units(a, u[:, 2])
+        ok = self.wealth[o] >= self._prices[assets]
+        self._sell(a[ok], o[ok], assets[ok])
+
+    def _adaptive_state(self, a):
+        w = self.wealth[a]
+        initial = self.initial_wealth
+        wealth_state = np.where(w > initial * 1.1, 0, np.where(w < initial * 0.9, 1, 2))
+
+        trend = self._trends[0] if len(self._trends) else TREND_CODES["stable"]
+
+        n_units = self.portfolio.units[a]
+        n_market = self.portfolio.n_assets
+        asset_state = np.where(n_units > n_market, 0, np.where(n_units < n_market, 1, 2))
+        return wealth_state * 9 + trend * 3 + asset_state
+
+    def _adaptive(self, a, o, u):
+        slot = self.q_slot[a]
+        q = self.q_table
+        reward = self.wealth[a] - self.last_wealth[a]
+        state = self._adaptive_state(a)
+
+        # Q-learning update for the previous (state, action)
+        seen = self.last_state[a] >= 0
+        s, act = self.last_state[a][seen], self.last_action[a][seen]
+        best_future = q[slot[seen], state[seen]].max(axis=1)
+        old_q = q[slot[seen], s, act]
+        q[slot[seen], s, act] = old_q + LEARNING_RATE * (
+            reward[seen] + DISCOUNT_FACTOR * best_future - old_q)
+        self.last_wealth[a] = self.wealth[a]
+
+        # Epsilon-greedy choice; ties go to the first action, as in max()
+        explore = u[:, 0] < EPSILON
+        action = np.where(explore, (u[:, 1] * 3).astype(np.int64),
+                          q[slot, state].argmax(axis=1))
+        self.last_state[a] = state
+        self.last_action[a] = action
+
+        buy = (action == BUY_ACTION) & (self.portfolio.units[o] > 0)
+        assets = self._pick_units(o[buy], u[buy, 2])
+        ok = self.wealth[a[buy]] >= self._prices[assets]
+        self._buy(a[buy][ok], o[buy][ok], assets[ok])
+
+        sell = (action == SELL_ACTION) & (self.portfolio.units[a] > 0)
+        assets = self._pick_units(a[sell], u[sell, 2])
+        ok = self.wealth[o[sell]] >= self._prices[assets]
+        self._sell(a[sell][ok], o[sell][ok], assets[ok])
+
+    # ---- Copycat ----
+
+    def _copycat(self, a):
+        """Update imitation state of copycats; returns the strategy each runs."""
+        waiting = self.copy_cooldown[a] > 0
+        self.copy_cooldown[a[waiting]] -= 1
+
+        ready = a[~waiting]
+        if len(ready):
+            best = self._wealthiest_neighbours(ready)
+            ok = best >= 0
+            ok[ok] = ((self.wealth[best[ok]] > self.wealth[ready[ok]])
+                      & (self.strategy[best[ok]] != CC))
+            self.copied[ready[ok]] = self.strategy[best[ok]]
+            self.copy_cooldown[ready[ok]] = COPY_COOLDOWN
+
+        copied = self.copied[a]
+        return np.where(copied < 0, AT, copied)
+
+    def _wealthiest_neighbours(self, agents):
+        """Wealthiest agent within radius 2 (own cell excluded), or -1."""
+        if self._neighbours_built_at != self.time:
+            grid = self.grid
+            self._neighbours.build(grid.x, grid.y, self.wealth, np.arange(self.num_agents))
+            self._neighbours_built_at = self.time
+        _, best = self._neighbours.query(self.grid.x[agents], self.grid.y[agents])
+        return best
+
+    # ---- Reporters ----
+
+    def strategy_counts(self):
+        return np.bincount(self.strategy, minlength=len(STRATEGIES))
+
+    def count_strategy(self, strategy_name) -> int:
+        return int((self.strategy == STRATEGIES.index(strategy_name)).sum())
+
+    def compute_gini(self):
+        """Compute the Gini coefficient of the model."""
+        return gini(self.wealth)
+
+    def get_wealthiest_agent(self):
+        return float(self.wealth.max())
+
+    def compute_avg_wealth(self):
+        return float(self.wealth.mean())
+
+    def current_wealthy_agents(self) -> int:
+        return int((self.wealth > 0).sum())
+
+    def current_non_wealthy_agents(self) -> int:
+        return int((self.wealth <= 0).sum())
+
+    def compute_total_wealth(self):
+        return float(self.wealth.sum())
+
+    def compute_total_trades(self):
+        return int(self.trades_completed.sum())
+
+    def compute_total_interactions(self):
+        return int(self.interactions.sum())
+
+    def agent_state(self):
+        return np.arange(self.num_agents), self.wealth, self.trades_completed, self.interactions
+
+    def initalize_data_collectors(self):
+        """Model-level series in memory, under FinancialModel's datacollector_*
+        names; agent series only go to the recorder, if there is one."""
+        self.metrics = MetricsCollector(self.market.get_asset_names(), STRATEGIES,
+                                        agent_series=False, recorder=self.recorder,
+                                        policies=self.collection,
+                                        rng=self.streams.generator("collector"))
+        for name, view in self.metrics.views().items():
+            setattr(self, name, view)
+
+    def collect_data(self):
+        self.metrics.collect(self, self.time)
+
+    def close_recorder(self):
+        if self.recorder is not None:
+            self.recorder.close()
@@ -2,8 +2,10 @@ from mesa.visualization.modules import CanvasGrid, ChartModule, TextElement
 from mesa.visualization.modules import BarChartModule, PieChartModule
 from mesa.visualization.ModularVisualization import ModularServer, VisualizationElement
 from mesa.visualization.UserParam import UserSettableParameter
-from FinancialModel import FinancialModel
+from EventLog import configure_logging
+from FinancialModel import FinancialModel, STEP_MODES
 from FinancialAgent import FinancialAgent
+from MetricsCollector import COLLECTION_PRESETS
 from strategies import STRATEGY_COLORS, STRATEGY_ABBREV
 
 
@@ -68,6 +70,42 @@ simulation_params = {
         description="Trigger a market-wide event at simulation start.",
     ),
 
+    "collection": UserSettableParameter(
+        "choice",
+        "Data Collection",
+        value="Full",
+        choices=list(COLLECTION_PRESETS),
+        description="How much per-agent data to keep: every step, a sample "
+                    "every 100 steps, or quantile summaries only.",
+    ),
+
+    "step_mode": UserSettableParameter(
+        "choice",
+        "Step Mode",
+        value="sequential",
+        choices=STEP_MODES,
+        description="sequential: agents trade one after another. two_phase: "
+                    "all agents decide on the same snapshot, then trades settle together.",
+    ),
+
+    "price_history_maxlen": UserSettableParameter(
+        "slider",
+        "Price History Length (0 = all)",
+        0,
+        0,
+        5000,
+        100,
+        description="Keep only this many most recent prices per asset.",
+    ),
+
+    "price_history_dtype": UserSettableParameter(
+        "choice",
+        "Price History Precision",
+        value="float64",
+        choices=["float64", "float32"],
+        description="float32 halves the memory of price histories.",
+    ),
+
     "width": UserSettableParameter(
         "slider",
         "Width",
@@ -220,4 +258,6 @@ server = ModularServer(
     8523
 )
 
+# Show completed trades in the console while the server runs
+configure_logging()
 server.launch()
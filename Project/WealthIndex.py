@@ -0,0 +1,179 @@
+from bisect import bisect_left
+from operator import mul
+
+
+class WealthIndex:
+    """Agent wealth kept in sorted order for rank statistics.
+
+    A bucketed sorted list: values live in sorted buckets of at most
+    2 * load entries, with each bucket's maximum, length and sum kept
+    alongside. The count, total and the rank-weighted sum
+    sum(i * x_(i)) are maintained too, so Gini, max, min and total are
+    O(1) and rank queries walk the bucket lengths.
+
+    Values are keyed (by agent id). set() only records the new value;
+    pending changes are applied on the next query, one O(sqrt n) update
+    each, or by a single re-sort when more than `rebuild_fraction` of the
+    keys changed, which is cheaper once most agents have traded.
+    """
+
+    def __init__(self, load=256, rebuild_fraction=0.05):
+        self._load = load
+        self.rebuild_fraction = rebuild_fraction
+        self._values = {}
+        self._pending = {}
+        self._rebuild()
+
+    def set(self, key, value):
+        """Record `value` as the current value for `key`."""
+        self._pending[key] = value
+
+    def __len__(self):
+        self._flush()
+        return self._count
+
+    # ---- Maintenance ----
+
+    def _flush(self):
+        pending = self._pending
+        if not pending:
+            return
+        if len(pending) > self.rebuild_fraction * len(self._values):
+            self._values.update(pending)
+            self._rebuild()
+        else:
+            values = self._values
+            for key, value in pending.items():
+                if key in values:
+                    self._update(values[key], value)
+                else:
+                    self._add(value)
+                values[key] = value
+        pending.clear()
+
+    def _rebuild(self):
+        values = sorted(self._values.values())
+        load = self._load
+        self._buckets = [values[i:i + load] for i in range(0, len(values), load)]
+        self._maxes = [b[-1] for b in self._buckets]
+        self._lens = [len(b) for b in self._buckets]
+        self._sums = [sum(b) for b in self._buckets]
+        self._count = len(values)
+        self._total = sum(self._sums)
+        self._weighted = sum(map(mul, range(len(values)), values))
+
+    def _locate(self, value):
+        b = bisect_left(self._maxes, value)
+        return min(b, len(self._buckets) - 1)
+
+    def _add(self, value):
+        if not self._buckets:
+            self._buckets, self._maxes = [[value]], [value]
+            self._lens, self._sums = [1], [value]
+            self._count, self._total, self._weighted = 1, value, 0
+            return
+
+        b = self._locate(value)
+        bucket = self._buckets[b]
+        pos = bisect_left(bucket, value)
+        rank = sum(self._lens[:b]) + pos
+        prefix = sum(self._sums[:b]) + sum(bucket[:pos])
+        # Everything from `rank` up moves one place higher
+        self._weighted += rank * value + (self._total - prefix)
+        self._total += value
+        self._count += 1
+
+        bucket.insert(pos, value)
+        self._maxes[b] = bucket[-1]
+        self._lens[b] += 1
+        self._sums[b] += value
+        if len(bucket) > 2 * self._load:
+            half = bucket[self._load:]
+            del bucket[self._load:]
+            self._buckets.insert(b + 1, half)
+            self._maxes[b] = bucket[-1]
+            self._maxes.insert(b + 1, half[-1])
+            self._lens[b:b + 1] = [len(bucket), len(half)]
+            self._sums[b:b + 1] = [sum(bucket), sum(half)]
+
+    def _remove(self, value):
+        b = self._locate(value)
+        bucket = self._buckets[b]
+        pos = bisect_left(bucket, value)
+        rank = sum(self._lens[:b]) + pos
+        prefix = sum(self._sums[:b]) + sum(bucket[:pos])
+        # Everything above `rank` moves one place lower
+        self._weighted -= rank * value + (self._total - prefix - value)
+        self._total -= value
+        self._count -= 1
+
+        del bucket[pos]
+        if bucket:
+            self._maxes[b] = bucket[-1]
+            self._lens[b] -= 1
+            self._sums[b] -= value
+        else:
+            del self._buckets[b], self._maxes[b], self._lens[b], self._sums[b]
+
+    def _update(self, old, new):
+        if old != new:
+            self._remove(old)
+            self._add(new)
+
+    # ---- Statistics ----
+
+    @property
+    def total(self):
+        self._flush()
+        return self._total
+
+    def max(self):
+        self._flush()
+        return self._maxes[-1]
+
+    def min(self):
+        self._flush()
+        return self._buckets[0][0]
+
+    def mean(self):
+        self._flush()
+        return self._total / self._count
+
+    def gini(self):
+        """Gini coefficient, same formula as FinancialModel's original."""
+        self._flush()
+        n, total = self._count, self._total
+        if n == 0 or total == 0:
+            return 0
+        # sum(x_(i) * (n - i)) == n * total - sum(i * x_(i))
+        b = (n * total - self._weighted) / (n * total)
+        return 1 + (1 / n) - 2 * b
+
+    def kth(self, k):
+        """k-th smallest value (0-based; negative counts from the top)."""
+        self._flush()
+        if k < 0:
+            k += self._count
+        if not 0 <= k < self._count:
+            raise IndexError("rank out of range")
+        for bucket, length in zip(self._buckets, self._lens):
+            if k < length:
+                return bucket[k]
+            k -= length
+
+    def quantile(self, q):
+        """Value at rank floor(q * (n - 1)), for q in [0, 1]."""
+        self._flush()
+        return self.kth(int(q * (self._count - 1)))
+
+    def top(self, k):
+        """The k largest values, largest first."""
+        self._flush()
+        out = []
+        if k <= 0:
+            return out
+        for bucket in reversed(self._buckets):
+            out.extend(reversed(bucket[-(k - len(out)):]))
+            if len(out) >= k:
+                break
+        return out
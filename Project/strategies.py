@@ -1,9 +1,20 @@
 from abc import ABC, abstractmethod
-import random
+
+from Settlement import TradeIntent
+from TradeJournal import BUY, SELL, TRANSFER
 
 
 class TradingStrategy(ABC):
-    """Base class for all trading strategies."""
+    """Base class for all trading strategies.
+
+    A strategy decides; it does not trade. decide() reads the market and
+    the counterparty and returns the trades it wants as TradeIntents. It
+    never changes the market, the counterparty, or anyone's wealth or
+    holdings; it may update the deciding agent's own bookkeeping (the
+    strategy's fear or Q-table, the agent's mood). execute() applies the
+    intents at once; the model's two-phase step collects every agent's
+    intents first and settles them together (Settlement.py).
+    """
 
     @property
     @abstractmethod
@@ -11,40 +22,39 @@ class TradingStrategy(ABC):
         """Display name used for visualization and data collection."""
 
     @abstractmethod
+    def decide(self, agent, other):
+        """Trades agent wants to make with other, as a list of TradeIntents."""
+
     def execute(self, agent, other):
         """Execute one trade interaction between agent and other."""
+        for intent in self.decide(agent, other):
+            agent.apply_intent(intent)
 
 
 class AssetTradingStrategy(TradingStrategy):
     name = "Asset Trading"
 
-    def execute(self, agent, other):
-        if len(other.assets) > 0:
-            asset = agent.random.choice(other.assets)
-            price = agent.model.market.get_price(asset.name)
+    def decide(self, agent, other):
+        if other.total_units > 0:
+            asset = other.random_asset()
+            price = agent.model.market.get_price(asset)
             fee = agent.model.market.transaction_cost * price
 
             if agent.wealth >= price + fee:
-                agent.execute_buy(other, asset)
-                agent._pay_fee(price)
+                return [TradeIntent(BUY, agent, other, asset, price, fee)]
+        return []
 
 
 class WealthTradingStrategy(TradingStrategy):
     name = "Wealth Trading"
 
-    def execute(self, agent, other):
+    def decide(self, agent, other):
         if other.wealth > 0 and agent.wealth >= 1:
             amount = agent.random.randint(1, int(agent.wealth))
 
             if agent.wealth >= amount:
-                other.wealth += amount
-                agent.wealth -= amount
-
-                print(agent._AGENT_PREFIX + str(agent.unique_id) + " traded " +
-                      str(amount) + " units of wealth with " +
-                      agent._AGENT_PREFIX + str(other.unique_id) + ".")
-
-                agent.trades_completed += 1
+                return [TradeIntent(TRANSFER, agent, other, None, amount, 0.0)]
+        return []
 
 
 class MeanReversionStrategy(TradingStrategy):
@@ -53,37 +63,41 @@ class MeanReversionStrategy(TradingStrategy):
     def __init__(self, threshold=0.2):
         self.threshold = threshold
 
-    def execute(self, agent, other):
-        if len(other.assets) > 0:
-            asset = agent.random.choice(other.assets)
+    def decide(self, agent, other):
+        if other.total_units > 0:
+            asset = other.random_asset()
             agent.print_interest(other, asset)
 
-            price = agent.model.market.get_price(asset.name)
-            mean = agent.model.market.get_mean_price(asset.name)
+            price = agent.model.market.get_price(asset)
+            mean = agent.model.market.get_mean_price(asset)
 
             if abs(price - mean) > self.threshold:
-                if agent.wealth >= price and asset in other.assets:
-                    agent.execute_buy(other, asset)
+                if agent.wealth >= price and other.owns(asset):
+                    return [TradeIntent(BUY, agent, other, asset, price, 0.0)]
+        return []
 
 
 class MomentumStrategy(TradingStrategy):
     name = "Momentum"
 
-    def execute(self, agent, other):
-        if len(other.assets) == 0:
-            return
+    def decide(self, agent, other):
+        if other.total_units == 0:
+            return []
 
-        asset = agent.random.choice(other.assets)
+        asset = other.random_asset()
         agent.print_interest(other, asset)
 
-        price = agent.model.market.get_price(asset.name)
-        trend = agent.model.market.get_asset_trend(asset.name)
+        market = agent.model.market
+        price = market.get_price(asset)
+        trend = market.get_asset_trend(asset)
 
         if trend == 'up' and agent.wealth >= price:
-            agent.execute_buy(other, asset)
-        elif trend == 'down' and other.wealth >= price and len(agent.assets) > 0:
-            asset_to_sell = agent.random.choice(agent.assets)
-            agent.execute_sell(other, asset_to_sell)
+            return [TradeIntent(BUY, agent, other, asset, price, 0.0)]
+        elif trend == 'down' and other.wealth >= price and agent.total_units > 0:
+            asset_to_sell = agent.random_asset()
+            return [TradeIntent(SELL, agent, other, asset_to_sell,
+                                market.get_price(asset_to_sell), 0.0)]
+        return []
 
 
 class CopycatStrategy(TradingStrategy):
@@ -102,24 +116,21 @@ class CopycatStrategy(TradingStrategy):
             "Adaptive": AdaptiveStrategy(initial_wealth),
         }
 
-    def execute(self, agent, other):
+    def decide(self, agent, other):
         if self.copy_cooldown <= 0:
-            neighbors = agent.model.grid.get_neighbors(
-                agent.pos, moore=True, include_center=False, radius=2)
-            if neighbors:
-                wealthiest = max(neighbors, key=lambda a: a.wealth)
-                if (wealthiest.wealth > agent.wealth
-                        and wealthiest.strategy.name != "Copycat"):
-                    self.copied_strategy_name = wealthiest.strategy.name
-                    self.copy_cooldown = 5
+            wealthiest = agent.model.wealthiest_neighbour(agent.pos)
+            if (wealthiest is not None
+                    and wealthiest.wealth > agent.wealth
+                    and wealthiest.strategy.name != "Copycat"):
+                self.copied_strategy_name = wealthiest.strategy.name
+                self.copy_cooldown = 5
         else:
             self.copy_cooldown -= 1
 
         strategy = self._fallbacks.get(self.copied_strategy_name)
         if strategy:
-            strategy.execute(agent, other)
-        else:
-            self._fallbacks["Asset Trading"].execute(agent, other)
+            return strategy.decide(agent, other)
+        return self._fallbacks["Asset Trading"].decide(agent, other)
 
 
 class RiskAverseStrategy(TradingStrategy):
@@ -151,26 +162,27 @@ class RiskAverseStrategy(TradingStrategy):
         else:
             agent.mood = "confident"
 
-    def execute(self, agent, other):
+    def decide(self, agent, other):
         self._update_fear(agent)
 
-        if random.random() < self.fear_level:
-            return
+        if agent.model.streams.uniforms("strategies").random() < self.fear_level:
+            return []
 
-        if len(other.assets) == 0:
-            return
+        if other.total_units == 0:
+            return []
 
-        asset = agent.random.choice(other.assets)
-        price = agent.model.market.get_price(asset.name)
-        mean = agent.model.market.get_mean_price(asset.name)
+        asset = other.random_asset()
+        price = agent.model.market.get_price(asset)
+        mean = agent.model.market.get_mean_price(asset)
 
         if price <= mean and agent.wealth >= price:
-            agent.execute_buy(other, asset)
-        elif price > mean * 1.2 and len(agent.assets) > 0:
-            asset_to_sell = agent.random.choice(agent.assets)
-            sell_price = agent.model.market.get_price(asset_to_sell.name)
+            return [TradeIntent(BUY, agent, other, asset, price, 0.0)]
+        elif price > mean * 1.2 and agent.total_units > 0:
+            asset_to_sell = agent.random_asset()
+            sell_price = agent.model.market.get_price(asset_to_sell)
             if other.wealth >= sell_price:
-                agent.execute_sell(other, asset_to_sell)
+                return [TradeIntent(SELL, agent, other, asset_to_sell, sell_price, 0.0)]
+        return []
 
 
 class AdaptiveStrategy(TradingStrategy):
@@ -198,7 +210,7 @@ class AdaptiveStrategy(TradingStrategy):
         trend = (agent.model.market.get_asset_trend(asset_names[0])
                  if asset_names else "stable")
 
-        n_assets = len(agent.assets)
+        n_assets = agent.total_units
         n_market = len(asset_names)
         if n_assets > n_market:
             asset_state = "heavy"
@@ -212,10 +224,10 @@ class AdaptiveStrategy(TradingStrategy):
     def _get_q(self, state, action):
         return self.q_table.get((state, action), 0.0)
 
-    def _choose_action(self, state):
+    def _choose_action(self, state, rng):
         actions = ["buy", "sell", "hold"]
-        if random.random() < self.epsilon:
-            return random.choice(actions)
+        if rng.random() < self.epsilon:
+            return rng.choice(actions)
         q_values = {a: self._get_q(state, a) for a in actions}
         return max(q_values, key=q_values.get)
 
@@ -230,26 +242,28 @@ class AdaptiveStrategy(TradingStrategy):
             reward + self.discount_factor * best_future - old_q)
         self.q_table[(self.last_state, self.last_action)] = new_q
 
-    def execute(self, agent, other):
+    def decide(self, agent, other):
         reward = agent.wealth - self.last_wealth
         self._update_q(agent, reward)
         self.last_wealth = agent.wealth
 
         state = self._get_state(agent)
-        action = self._choose_action(state)
+        action = self._choose_action(
+            state, agent.model.streams.uniforms("strategies"))
         self.last_state = state
         self.last_action = action
 
-        if action == "buy" and len(other.assets) > 0:
-            asset = agent.random.choice(other.assets)
-            price = agent.model.market.get_price(asset.name)
+        if action == "buy" and other.total_units > 0:
+            asset = other.random_asset()
+            price = agent.model.market.get_price(asset)
             if agent.wealth >= price:
-                agent.execute_buy(other, asset)
-        elif action == "sell" and len(agent.assets) > 0:
-            asset = agent.random.choice(agent.assets)
-            sell_price = agent.model.market.get_price(asset.name)
+                return [TradeIntent(BUY, agent, other, asset, price, 0.0)]
+        elif action == "sell" and agent.total_units > 0:
+            asset = agent.random_asset()
+            sell_price = agent.model.market.get_price(asset)
             if other.wealth >= sell_price:
-                agent.execute_sell(other, asset)
+                return [TradeIntent(SELL, agent, other, asset, sell_price, 0.0)]
+        return []
 
 
 STRATEGY_NAMES = [
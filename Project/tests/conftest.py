@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The simulation modules live flat in Project/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from FinancialModel import FinancialModel
+from TradeJournal import read_journal
+
+
+def state(model):
+    """Everything a continuation has to reproduce."""
+    names = model.market.get_asset_names()
+    return ([a.wealth for a in model.schedule.agents],
+            model.portfolio.quantities.tolist(),
+            [a.pos for a in model.schedule.agents],
+            [list(model.market.get_price_history(name)) for name in names],
+            model.market.total_fees_collected,
+            model.compute_total_trades())
+
+
+def make_model(**kwargs):
+    return FinancialModel(60, 10, 10, "Random Mix", 20, seed=11, **kwargs)
+
+
+@pytest.mark.parametrize("backend, step_mode", [
+    ("multigrid", "sequential"),
+    ("array", "sequential"),
+    ("sparse", "sequential"),
+    ("multigrid", "two_phase"),
+])
+def test_restore_and_fork_continue_like_the_original(tmp_path, backend, step_mode):
+    path = str(tmp_path / "model.ckpt")
+    model = make_model(grid_backend=backend, step_mode=step_mode)
+    for _ in range(15):
+        model.step()
+    model.checkpoint(path)
+    fork = model.fork()
+    restored = FinancialModel.restore(path)
+
+    for m in (model, fork, restored):
+        for _ in range(15):
+            m.step()
+    assert state(restored) == state(model)
+    assert state(fork) == state(model)
+
+
+def test_seeded_fork_leaves_the_parent_alone():
+    reference = make_model()
+    parent = make_model()
+    for _ in range(15):
+        reference.step()
+        parent.step()
+
+    fork = parent.fork(seed=99)
+    for _ in range(15):
+        fork.step()
+        parent.step()
+        reference.step()
+    assert state(parent) == state(reference)
+    assert state(fork) != state(parent)
+
+
+def test_resumed_journal_matches_an_uninterrupted_one(tmp_path):
+    whole = tmp_path / "whole.bin"
+    model = make_model(journal_path=str(whole))
+    for _ in range(30):
+        model.step()
+    model.close_journal()
+
+    resumed = tmp_path / "resumed.bin"
+    path = str(tmp_path / "model.ckpt")
+    model = make_model(journal_path=str(resumed))
+    for _ in range(15):
+        model.step()
+    model.checkpoint(path)
+    # Steps written after the checkpoint are dropped on resume
+    for _ in range(5):
+        model.step()
+    model.close_journal()
+
+    model = FinancialModel.restore(path, resume_journal=True)
+    for _ in range(15):
+        model.step()
+    model.close_journal()
+
+    expected, got = read_journal(str(whole))[1], read_journal(str(resumed))[1]
+    assert len(got) == len(expected)
+    assert (got == expected).all()
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from ArrayGrid import neighbourhood_offsets
+from NeighbourIndex import NeighbourWealthIndex
+
+
+def brute_force(width, height, radius, xs, ys, wealth):
+    """Wealth of the wealthiest agent around every cell, -inf where none."""
+    offsets = neighbourhood_offsets(width, height, radius)
+    best = np.full((height, width), -np.inf)
+    for y in range(height):
+        for x in range(width):
+            window = {((x + dx) % width, (y + dy) % height) for dx, dy in offsets}
+            for ax, ay, w in zip(xs, ys, wealth):
+                if (ax, ay) in window:
+                    best[y, x] = max(best[y, x], w)
+    return best
+
+
+@pytest.mark.parametrize("width, height, radius, n", [
+    (7, 5, 1, 12), (9, 9, 2, 30), (4, 6, 3, 8), (12, 3, 2, 0), (10, 10, 2, 1),
+])
+def test_dense_and_sparse_agree_with_brute_force(width, height, radius, n):
+    rng = np.random.default_rng(width * height + n)
+    xs = rng.integers(0, width, n)
+    ys = rng.integers(0, height, n)
+    # Distinct wealth, so the wealthiest neighbour is unique
+    wealth = rng.permutation(n).astype(float)
+    ids = np.arange(100, 100 + n)
+    expected = brute_force(width, height, radius, xs, ys, wealth)
+
+    cy, cx = np.indices((height, width))
+    for dense in (True, False):
+        index = NeighbourWealthIndex(width, height, radius, dense=dense)
+        index.build(xs, ys, wealth, ids)
+        best_wealth, best_ids = index.query(cx, cy)
+        assert (best_wealth == expected).all()
+        found = np.isfinite(expected)
+        assert (best_ids[~found] == -1).all()
+        assert (wealth[best_ids[found] - 100] == expected[found]).all()
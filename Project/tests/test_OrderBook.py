@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from OrderBook import OrderBook, BID, ASK
+
+
+def naive_match(orders, n_assets):
+    """Repeatedly cross the best bid with the best ask, one asset at a time.
+
+    orders is a list of [asset, side, price, quantity, agent] in arrival
+    order; quantities are reduced in place. Returns the fills as
+    (asset, buyer, seller, price, quantity) tuples.
+    """
+    fills = []
+    for a in range(n_assets):
+        while True:
+            bids = [i for i, o in enumerate(orders) if o[0] == a and o[1] == BID and o[3] > 0]
+            asks = [i for i, o in enumerate(orders) if o[0] == a and o[1] == ASK and o[3] > 0]
+            if not bids or not asks:
+                break
+            b = min(bids, key=lambda i: (-orders[i][2], i))
+            s = min(asks, key=lambda i: (orders[i][2], i))
+            if orders[b][2] < orders[s][2]:
+                break
+            qty = min(orders[b][3], orders[s][3])
+            price = orders[min(b, s)][2]
+            fills.append((a, orders[b][4], orders[s][4], price, qty))
+            orders[b][3] -= qty
+            orders[s][3] -= qty
+    return fills
+
+
+def as_tuples(trades):
+    return list(zip(trades["asset"].tolist(), trades["buyer"].tolist(),
+                    trades["seller"].tolist(), trades["price"].tolist(),
+                    trades["quantity"].tolist()))
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_match_agrees_with_naive_matcher(seed):
+    rng = np.random.default_rng(seed)
+    n_assets = int(rng.integers(1, 4))
+    book = OrderBook(n_assets, capacity=4)
+    orders = []
+    # Several rounds, so resting orders and partial fills carry over
+    for _ in range(3):
+        k = int(rng.integers(0, 40))
+        asset = rng.integers(0, n_assets, k)
+        side = rng.integers(0, 2, k)
+        # Coarse prices and integer sizes give plenty of ties and partial fills
+        price = rng.integers(8, 13, k).astype(np.float64)
+        qty = rng.integers(1, 5, k).astype(np.float64)
+        agent = rng.integers(0, 20, k)
+        if rng.random() < 0.5:
+            book.add_many(agent, asset, side, price, qty)
+        else:
+            for row in zip(agent, asset, side, price, qty):
+                book.add(*row)
+        orders.extend([int(a), int(s), float(p), float(q), int(g)]
+                      for a, s, p, q, g in zip(asset, side, price, qty, agent))
+
+        assert as_tuples(book.match()) == naive_match(orders, n_assets)
+        assert book.quantity[:len(book)].tolist() == [o[3] for o in orders]
+
+        book.compact()
+        orders = [o for o in orders if o[3] > 0]
+
+
+def test_cancelled_orders_do_not_fill():
+    book = OrderBook(1)
+    book.add(1, 0, BID, 10.0, 2)
+    stale = book.add(2, 0, ASK, 9.0, 1)
+    book.add(3, 0, ASK, 10.0, 1)
+    assert book.cancel(stale)
+    assert not book.cancel(stale)
+    assert as_tuples(book.match()) == [(0, 1, 3, 10.0, 1.0)]
+    assert book.depth(0) == (1.0, 0.0)
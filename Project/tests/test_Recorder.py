@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from FinancialModel import FinancialModel
+from Recorder import read_recording
+
+
+def make_model(path, fmt):
+    return FinancialModel(50, 10, 10, "Random Mix", 10, seed=2, collection="Full",
+                          recorder_path=str(path), recorder_format=fmt)
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_resumed_recording_matches_an_uninterrupted_one(tmp_path, fmt):
+    model = make_model(tmp_path / "whole", fmt)
+    for _ in range(60):
+        model.step()
+    model.close_recorder()
+
+    path = str(tmp_path / "model.ckpt")
+    model = make_model(tmp_path / "resumed", fmt)
+    for _ in range(30):
+        model.step()
+    model.checkpoint(path)
+    # Rows recorded after the checkpoint are dropped on resume
+    for _ in range(20):
+        model.step()
+    model.close_recorder()
+
+    model = FinancialModel.restore(path, resume_recorder=True)
+    for _ in range(30):
+        model.step()
+    model.close_recorder()
+
+    expected, expected_agents = read_recording(str(tmp_path / "whole"))
+    got, got_agents = read_recording(str(tmp_path / "resumed"))
+    assert got.equals(expected)
+    assert got_agents.keys() == expected_agents.keys()
+    for series in expected_agents:
+        assert got_agents[series].equals(expected_agents[series])
+
+
+def test_refuses_to_overwrite_a_recording(tmp_path):
+    model = make_model(tmp_path, "parquet")
+    model.step()
+    model.close_recorder()
+    (tmp_path / "notes-00001.txt").write_text("kept")
+    with pytest.raises(FileExistsError):
+        make_model(tmp_path, "parquet")
+    FinancialModel(50, 10, 10, "Random Mix", 10, seed=2, recorder_path=str(tmp_path),
+                   recorder_overwrite=True).close_recorder()
+    assert (tmp_path / "notes-00001.txt").read_text() == "kept"
@@ -0,0 +1,39 @@
+import numpy as np
+
+from FinancialModel import FinancialModel
+from Settlement import TradeIntent, settle
+from TradeJournal import BUY, SELL, TRANSFER
+
+
+def test_two_phase_conserves_wealth_and_units():
+    model = FinancialModel(120, 6, 6, "Random Mix", 5, seed=2, step_mode="two_phase")
+    money = model.compute_total_wealth() + model.market.total_fees_collected
+    units = model.portfolio.quantities.sum(axis=0)
+    for _ in range(40):
+        model.step()
+        wealth = np.array([a.wealth for a in model.schedule.agents])
+        assert (wealth >= -1e-9).all()
+        assert (model.portfolio.quantities >= 0).all()
+        assert (model.portfolio.quantities.sum(axis=0) == units).all()
+        assert np.isclose(wealth.sum() + model.market.total_fees_collected, money)
+
+
+def test_double_spends_are_refused():
+    model = FinancialModel(3, 3, 3, "Asset Trading", 5, seed=1)
+    a, b, c = model.schedule.agents
+    gold = model.market.asset_index["Gold"]
+    model.portfolio.quantities[a.unique_id, gold] = 1
+    a.wealth, b.wealth, c.wealth = 5, 20, 20
+    held = model.portfolio.quantities[:, gold].copy()
+
+    intents = [
+        TradeIntent(TRANSFER, a, b, None, 3.0, 0.0),
+        TradeIntent(TRANSFER, a, c, None, 3.0, 0.0),  # a has 2 left
+        TradeIntent(SELL, a, b, "Gold", 4.0, 0.0),
+        TradeIntent(BUY, c, a, "Gold", 4.0, 0.0),     # a's only unit is sold
+    ]
+    accepted = settle(model, intents)
+    assert accepted.tolist() == [True, False, True, False]
+    assert (a.wealth, b.wealth, c.wealth) == (6.0, 19.0, 20.0)
+    moved = model.portfolio.quantities[:, gold] - held
+    assert moved[[a.unique_id, b.unique_id, c.unique_id]].tolist() == [-1, 1, 0]
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from FinancialModel import FinancialModel
+from TradeJournal import JournalReplay
+
+
+@pytest.mark.parametrize("step_mode", ["sequential", "two_phase"])
+def test_replay_rebuilds_balances_and_prices(tmp_path, step_mode):
+    path = tmp_path / "journal.bin"
+    model = FinancialModel(60, 10, 10, "Random Mix", 20, seed=3,
+                           journal_path=str(path), step_mode=step_mode)
+    for _ in range(30):
+        model.step()
+    model.close_journal()
+
+    replay = JournalReplay(str(path))
+    agents = model.schedule.agents
+    assert np.allclose(replay.cash, [a.wealth for a in agents])
+    assert (replay.holdings == model.portfolio.quantities).all()
+    assert np.allclose(replay.fees_paid, [a.fees_paid for a in agents])
+    assert np.allclose(replay.market.price_vector(), model.market.price_vector())
+
+
+def test_replay_up_to_step_matches_earlier_state(tmp_path):
+    path = tmp_path / "journal.bin"
+    model = FinancialModel(40, 8, 8, "Random Mix", 20, seed=4, journal_path=str(path))
+    for _ in range(10):
+        model.step()
+    cash = [a.wealth for a in model.schedule.agents]
+    holdings = model.portfolio.quantities.copy()
+    for _ in range(10):
+        model.step()
+    model.close_journal()
+
+    # Records carry the 0-based index of the step that wrote them
+    replay = JournalReplay(str(path), up_to_step=9)
+    assert np.allclose(replay.cash, cash)
+    assert (replay.holdings == holdings).all()
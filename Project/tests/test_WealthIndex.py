@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from WealthIndex import WealthIndex
+
+
+def naive_gini(values):
+    """FinancialModel's original Gini computation."""
+    x = sorted(values)
+    n = len(x)
+    total = sum(x)
+    if n == 0 or total == 0:
+        return 0
+    b = sum(xi * (n - i) for i, xi in enumerate(x)) / (n * total)
+    return 1 + (1 / n) - 2 * b
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_statistics_agree_with_sorting(seed):
+    rng = np.random.default_rng(seed)
+    n = 300
+    values = dict(enumerate(rng.integers(0, 50, n).astype(float).tolist()))
+    index = WealthIndex(load=8)
+    for key, value in values.items():
+        index.set(key, value)
+
+    # Alternate small batches (incremental updates) with large ones (rebuilds)
+    for batch in [3, 200, 1, 10, 300, 5]:
+        for key in rng.integers(0, n, batch).tolist():
+            values[key] = float(rng.integers(0, 50))
+            index.set(key, values[key])
+
+        x = sorted(values.values())
+        assert len(index) == n
+        assert index.total == pytest.approx(sum(x))
+        assert index.gini() == pytest.approx(naive_gini(x))
+        assert (index.min(), index.max()) == (x[0], x[-1])
+        assert [index.kth(k) for k in (0, 17, n // 2, -1)] == [x[0], x[17], x[n // 2], x[-1]]
+        assert index.quantile(0.9) == x[int(0.9 * (n - 1))]
+        assert index.top(12) == x[::-1][:12]
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from mesa.space import MultiGrid
+
+from ArrayGrid import ArrayGrid
+from SparseGrid import SparseGrid
+
+
+def ids(agents):
+    return sorted(a.unique_id for a in agents)
+
+
+@pytest.mark.parametrize("grid_class", [ArrayGrid, SparseGrid])
+@pytest.mark.parametrize("width, height", [(7, 5), (3, 3), (10, 4)])
+def test_grid_answers_like_multigrid(grid_class, width, height):
+    rng = np.random.default_rng(width * 10 + height)
+    reference = MultiGrid(width, height, torus=True)
+    grid = grid_class(width, height, torus=True)
+    agents = [(SimpleNamespace(unique_id=i, pos=None),
+               SimpleNamespace(unique_id=i, pos=None))
+              for i in range(15)]
+
+    def place(pos):
+        return (int(pos[0]), int(pos[1]))
+
+    for ref_agent, agent in agents:
+        pos = place(rng.integers(0, (width, height)))
+        reference.place_agent(ref_agent, pos)
+        grid.place_agent(agent, pos)
+    for ref_agent, agent in agents[::3]:
+        pos = place(rng.integers(0, (width, height)))
+        reference.move_agent(ref_agent, pos)
+        grid.move_agent(agent, pos)
+
+    for x in range(width):
+        for y in range(height):
+            pos = (x, y)
+            assert grid.is_cell_empty(pos) == reference.is_cell_empty(pos)
+            assert ids(grid.get_cell_list_contents(pos)) \
+                == ids(reference.get_cell_list_contents(pos))
+            for radius in (1, 2):
+                for moore in (True, False):
+                    assert grid.get_neighborhood(pos, moore, False, radius) \
+                        == reference.get_neighborhood(pos, moore, False, radius)
+                    assert ids(grid.get_neighbors(pos, moore, False, radius)) \
+                        == ids(reference.get_neighbors(pos, moore, False, radius))